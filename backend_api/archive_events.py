@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Script to archive tracked events that are past retention (run it from cron
+after rollup_metrics.py, e.g. daily)
+
+Monthly partitions of user_activities and search_analytics older than the
+retention window are written to gzip JSONL files under src/database/archive
+and dropped. The freed pages are then returned to the filesystem a batch at
+a time, so writers are never locked out for long.
+"""
+
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.models.analytics import archive_raw_events, ARCHIVE_DIR, RAW_EVENT_RETENTION_MONTHS
+from src.models.partition import enable_incremental_vacuum, incremental_vacuum_enabled, reclaim_space
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--keep-months', type=int, default=RAW_EVENT_RETENTION_MONTHS,
+                        help='full months of events to keep besides the current one')
+    parser.add_argument('--reclaim-pages', type=int, default=1000,
+                        help='free pages to release per transaction')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='switch the database to auto_vacuum=INCREMENTAL (one full VACUUM)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        archived = archive_raw_events(args.archive_dir, args.keep_months)
+        for table, month, rows, path in archived:
+            print(f"  {table} {month:%Y-%m}: {rows} rows -> {path}")
+        print(f"Archived {len(archived)} partitions")
+
+        if args.enable_incremental_vacuum and not incremental_vacuum_enabled():
+            enable_incremental_vacuum()
+            print("Enabled incremental vacuum")
+        if incremental_vacuum_enabled():
+            free_pages = reclaim_space(args.reclaim_pages)
+            while free_pages:
+                time.sleep(0.05)  # let writers in between batches
+                remaining = reclaim_space(args.reclaim_pages)
+                if remaining >= free_pages:
+                    break
+                free_pages = remaining
+            print("Reclaimed the freed pages")
+        else:
+            print("Freed pages stay in the database file until it uses incremental vacuum "
+                  "(run once with --enable-incremental-vacuum)")
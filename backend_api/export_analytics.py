@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Script to export the analytics tables as memory-mappable NumPy columns for
+offline analysis
+
+Each table becomes a directory of <column>.npy files (one array per
+column, row-aligned) described by manifest.json. Nullable integer columns
+also get a <column>.mask.npy marking their NULL rows, listed under the
+table's "masks" in the manifest. Open them with np.load(path, mmap_mode='r')
+or src.utils.columnar.open_table(), which maps the files instead of reading
+them and applies the masks.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.models.user import db
+from src.models.analytics import BusinessAnalytics, PlatformMetrics
+from src.utils.columnar import export_table, write_manifest
+
+EXPORT_DIR = os.path.join(os.path.dirname(__file__), 'src', 'database', 'exports')
+TABLES = (BusinessAnalytics.__table__, PlatformMetrics.__table__)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('directory', nargs='?',
+                        default=os.path.join(EXPORT_DIR, f'analytics-{datetime.utcnow():%Y%m%d-%H%M%S}'))
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    # Built next to the target and moved into place when complete
+    staging = f'{args.directory}.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    started = time.perf_counter()
+    with app.app_context():
+        connection = db.session.connection()
+        tables = {}
+        for table in TABLES:
+            tables[table.name] = export_table(connection, table, staging, args.chunk_size)
+            print(f"  {table.name}: {tables[table.name]['rows']} rows, {len(tables[table.name]['columns'])} columns")
+        db.session.rollback()
+    write_manifest(staging, tables)
+    shutil.rmtree(args.directory, ignore_errors=True)
+    os.replace(staging, args.directory)
+    print(f"Exported {len(tables)} tables to {args.directory} in {time.perf_counter() - started:.1f}s")
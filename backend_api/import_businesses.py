@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Script to bulk import a businesses.json export (the frontend's listing
+format) into the businesses table.
+
+The file is parsed incrementally and written in batches of multi-row
+upserts keyed on the record id, all in one transaction, so memory stays
+flat however large the file is and re-importing an updated export
+updates the existing rows instead of duplicating them. Slugs and the
+dimension counts are brought up to date batch by batch as well.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.main import app
+from src.models.user import db
+from src.models.business import Business, _DIMENSION_FIELDS
+from src.models.catalog import mark_bulk_change
+from src.models.dimension import canonical_key, dimension_entries, adjust_dimensions
+from src.models.slug import assign_slugs
+from src.utils.json_stream import iter_json_array
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), '..', 'frontend_app', 'public', 'businesses.json')
+DEFAULT_BATCH_SIZE = 5000
+
+# Columns overwritten when a record is imported again (created_at and the
+# rating aggregates are kept)
+UPDATED_COLUMNS = (
+    'name', 'description', 'address', 'city', 'state', 'zip_code', 'phone', 'website',
+    'category', 'minority_type', 'is_verified', 'image_url', 'hours', 'updated_at',
+    'city_key', 'state_key', 'category_key', 'minority_type_key'
+)
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ''
+
+def to_row(record, now):
+    """Map a businesses.json record onto businesses columns, None to skip it"""
+    if record.get('approved') is False or record.get('status') not in (None, 'approved'):
+        return None
+    name = _text(record.get('name'))
+    if not name:
+        return None
+
+    city = _text(record.get('city'))
+    state = _text(record.get('state'))
+    category = _text(record.get('category')) or _text(record.get('type')) or 'Other'
+    minority_type = _text(record.get('ownerEthnicity')) or _text(record.get('owner')) or 'Minority-owned'
+
+    # A few records have no id; fall back to name and city
+    external_id = record.get('id')
+    if external_id is None or external_id == '':
+        external_id = f'{canonical_key(name)}|{canonical_key(city) or ""}'
+    external_id = str(external_id)[:64]
+
+    created_at = now
+    if record.get('dateAdded'):
+        try:
+            created_at = datetime.strptime(record['dateAdded'][:10], '%Y-%m-%d')
+        except ValueError:
+            pass
+
+    return {
+        'external_id': external_id,
+        'name': name,
+        'description': _text(record.get('description')) or None,
+        'address': _text(record.get('address')),
+        'city': city,
+        'state': state,
+        'zip_code': _text(record.get('zip')) or None,
+        'phone': _text(record.get('phone')) or None,
+        'website': _text(record.get('website')) or None,
+        'category': category,
+        'minority_type': minority_type,
+        'is_verified': bool(record.get('verified')),
+        'image_url': _text(record.get('image')) or None,
+        'hours': _text(record.get('hours')) or None,
+        'created_at': created_at,
+        'updated_at': now,
+        'city_key': canonical_key(city),
+        'state_key': canonical_key(state),
+        'category_key': canonical_key(category),
+        'minority_type_key': canonical_key(minority_type),
+    }
+
+def _upsert_statement():
+    statement = sqlite_insert(Business.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=['external_id'],
+        set_={column: statement.excluded[column] for column in UPDATED_COLUMNS}
+    )
+
+def _existing(connection, external_ids):
+    """{external_id: row} of the businesses already stored for these ids"""
+    businesses = Business.__table__
+    rows = connection.execute(
+        db.select(businesses.c.id, businesses.c.external_id, *[businesses.c[f] for f in _DIMENSION_FIELDS])
+        .where(businesses.c.external_id.in_(external_ids))
+    )
+    return {row.external_id: row for row in rows}
+
+def _apply_batch(connection, statement, rows):
+    """Upsert one batch, then fix up its slugs and dimension counts.
+
+    Core writes skip the model hooks, so this does their work for just the
+    rows of the batch: the dimension counts move by the difference between
+    the stored and the imported values, and only these businesses are
+    checked for a new slug.
+    """
+    businesses = Business.__table__
+    external_ids = [row['external_id'] for row in rows]
+    before = _existing(connection, external_ids)
+    # executemany of one compiled statement: no ORM objects, no per-row round trips
+    connection.execute(statement, rows)
+
+    dimension_deltas = Counter()
+    for row in rows:
+        new_entries = set(dimension_entries(*(row[f] for f in _DIMENSION_FIELDS)))
+        old = before.get(row['external_id'])
+        if old is None:
+            dimension_deltas.update(new_entries)
+            continue
+        old_entries = set(dimension_entries(*(getattr(old, f) for f in _DIMENSION_FIELDS)))
+        dimension_deltas.subtract(old_entries - new_entries)
+        dimension_deltas.update(new_entries - old_entries)
+    by_delta = defaultdict(list)
+    for entry, delta in dimension_deltas.items():
+        if delta:
+            by_delta[delta].append(entry)
+    for delta, entries in by_delta.items():
+        adjust_dimensions(connection, entries, delta)
+
+    business_ids = connection.execute(
+        db.select(businesses.c.id).where(businesses.c.external_id.in_(external_ids))
+    ).scalars().all()
+    assign_slugs(connection, business_ids)
+
+def import_businesses(path, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert every record of `path`; returns (imported, skipped, seconds)"""
+    statement = _upsert_statement()
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    imported = skipped = 0
+    batch = {}
+
+    def flush():
+        nonlocal imported
+        _apply_batch(db.session.connection(), statement, list(batch.values()))
+        imported += len(batch)
+        batch.clear()
+        elapsed = time.perf_counter() - started
+        print(f"  {imported} imported ({imported / elapsed:.0f} records/s)")
+
+    with open(path, encoding='utf-8') as stream:
+        for record in iter_json_array(stream):
+            row = to_row(record, now) if isinstance(record, dict) else None
+            if row is None:
+                skipped += 1
+                continue
+            # A repeated id in the same batch would hit the conflict twice
+            # in one statement; the later record wins either way
+            batch[row['external_id']] = row
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    # The in-memory indexes don't see Core writes; have them reload
+    mark_bulk_change()
+    db.session.commit()
+    return imported, skipped, time.perf_counter() - started
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            imported, skipped, seconds = import_businesses(args.path, args.batch_size)
+        except Exception:
+            db.session.rollback()
+            raise
+    print(f"Imported {imported} businesses ({skipped} skipped) in {seconds:.1f}s "
+          f"({imported / max(seconds, 1e-9):.0f} records/s)")
@@ -12,6 +12,9 @@ from src.main import app
 from src.models.user import db, User
 from src.models.business import Business
 from src.models.review import Review
+from src.models.search import init_search_index
+from src.models.geo import init_geo_index
+from src.models.catalog import init_catalog_version
 
 def create_sample_data():
     """Create sample businesses and reviews"""
@@ -20,6 +23,9 @@ def create_sample_data():
         # Clear existing data
         db.drop_all()
         db.create_all()
+        init_search_index(rebuild=True)
+        init_geo_index(rebuild=True)
+        init_catalog_version()
         
         # Create sample users
         users = [
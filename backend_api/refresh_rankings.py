@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Script to recompute the per-category business rankings shown on the
+business performance dashboard (run it from cron, e.g. hourly)
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.models.analytics import refresh_category_rankings
+
+if __name__ == '__main__':
+    with app.app_context():
+        ranked = refresh_category_rankings()
+    print(f"Ranked {ranked} businesses within their categories")
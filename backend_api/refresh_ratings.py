@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Script to backfill or repair the review_count / rating_sum aggregates
+stored on businesses from the reviews table
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.models.business import refresh_rating_aggregates
+
+if __name__ == '__main__':
+    with app.app_context():
+        updated = refresh_rating_aggregates()
+    print(f"Recomputed rating aggregates for {updated} businesses")
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Script to roll up the platform metrics of every closed day not yet in
+platform_metrics (run it from cron, e.g. daily shortly after midnight UTC;
+reruns only add new days)
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.models.analytics import rollup_platform_metrics, platform_metrics_watermark
+
+if __name__ == '__main__':
+    with app.app_context():
+        written = rollup_platform_metrics()
+        watermark = platform_metrics_watermark()
+    print(f"Rolled up {written} days of platform metrics "
+          f"(complete through {watermark.isoformat() if watermark else 'no data yet'})")
@@ -0,0 +1,159 @@
+import threading
+from ..models.user import db
+from ..models.catalog import on_catalog_change, CatalogChangeWatcher
+from ..models.dimension import dimension_entries
+
+FACET_DIMENSIONS = ('category', 'minority_type', 'state', 'city', 'is_verified')
+
+def _facet_entries(business):
+    """(dimension, key, label) entries for a business column-value dict"""
+    entries = dimension_entries(business['city'], business['state'], business['category'], business['minority_type'])
+    verified = bool(business['is_verified'])
+    entries.append(('is_verified', 'true' if verified else 'false', verified))
+    return entries
+
+def _bitmap(ids):
+    """Build an int bitmap with bit `id` set for each id, in one pass"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for business_id in ids:
+        buffer[business_id >> 3] |= 1 << (business_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+class FacetIndex:
+    """In-memory inverted index of businesses per facet value.
+
+    Each facet value maps to a bitmap (a Python int with bit `business.id`
+    set), so the businesses matching a filter combination are the AND of a
+    few bitmaps and a facet count is a popcount. The index is loaded from
+    the catalog on first use and then kept current from committed business
+    changes (see on_catalog_change); each worker process has its own copy,
+    which also picks up the other processes' writes (see CatalogChangeFeed).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._bitmaps = {}  # dimension -> key -> bitmap
+        self._labels = {}  # dimension -> key -> label
+        self._entries = {}  # business id -> entries, for removal
+        self._all = 0
+        self._changes = CatalogChangeWatcher()
+
+    def _reset(self):
+        self._bitmaps = {dimension: {} for dimension in FACET_DIMENSIONS}
+        self._labels = {dimension: {} for dimension in FACET_DIMENSIONS}
+        self._entries = {}
+        self._all = 0
+
+    def load(self):
+        """(Re)build the index from the businesses table"""
+        from ..models.business import Business
+
+        self._changes.mark_loaded()
+        businesses = Business.__table__
+        rows = db.session.execute(db.select(
+            businesses.c.id, businesses.c.city, businesses.c.state, businesses.c.category,
+            businesses.c.minority_type, businesses.c.is_verified
+        )).mappings()
+
+        ids_by_value = {}
+        with self._lock:
+            self._reset()
+            for row in rows:
+                entries = _facet_entries(row)
+                self._entries[row['id']] = entries
+                for dimension, key, label in entries:
+                    ids_by_value.setdefault((dimension, key), []).append(row['id'])
+                    self._labels[dimension].setdefault(key, label)
+            for (dimension, key), ids in ids_by_value.items():
+                self._bitmaps[dimension][key] = _bitmap(ids)
+            self._all = _bitmap(self._entries)
+            self._loaded = True
+
+    def apply(self, upserted, deleted_ids):
+        """Apply committed business changes"""
+        with self._lock:
+            if not self._loaded:
+                return
+            for business_id in list(deleted_ids) + [b['id'] for b in upserted]:
+                self._remove(business_id)
+            for business in upserted:
+                self._add(business['id'], _facet_entries(business))
+
+    def _add(self, business_id, entries):
+        bit = 1 << business_id
+        self._entries[business_id] = entries
+        self._all |= bit
+        for dimension, key, label in entries:
+            bitmaps = self._bitmaps[dimension]
+            bitmaps[key] = bitmaps.get(key, 0) | bit
+            self._labels[dimension].setdefault(key, label)
+
+    def _remove(self, business_id):
+        entries = self._entries.pop(business_id, None)
+        if entries is None:
+            return
+        bit = 1 << business_id
+        self._all &= ~bit
+        for dimension, key, _ in entries:
+            bitmaps = self._bitmaps[dimension]
+            bitmaps[key] &= ~bit
+            if not bitmaps[key]:
+                del bitmaps[key]
+                del self._labels[dimension][key]
+
+    def counts(self, filters, restrict_ids=None, limit=20):
+        """Facet counts for a filter combination.
+
+        `filters` maps dimensions to canonical keys. Each dimension's counts
+        apply every filter except its own, so the UI can show the
+        alternatives to the current selection. `restrict_ids` (e.g. the
+        full-text matches) further limits the candidate set. Returns the
+        total matching all filters and up to `limit` values per dimension,
+        most frequent first.
+        """
+        if not self._loaded or self._changes.stale():
+            self.load()
+
+        with self._lock:
+            base = self._all
+            if restrict_ids is not None:
+                base &= _bitmap(restrict_ids)
+
+            masks = {}
+            for dimension, key in filters.items():
+                bitmaps = self._bitmaps[dimension]
+                if dimension == 'city' and '|' not in key:
+                    # City without a state: any state's city of that name
+                    masks[dimension] = 0
+                    for city_key, bitmap in bitmaps.items():
+                        if city_key.endswith('|' + key):
+                            masks[dimension] |= bitmap
+                else:
+                    masks[dimension] = bitmaps.get(key, 0)
+
+            def mask_without(excluded):
+                mask = base
+                for dimension, bitmap in masks.items():
+                    if dimension != excluded:
+                        mask &= bitmap
+                return mask
+
+            facets = {}
+            for dimension in FACET_DIMENSIONS:
+                mask = mask_without(dimension)
+                values = []
+                for key, bitmap in self._bitmaps[dimension].items():
+                    count = (bitmap & mask).bit_count()
+                    if count:
+                        values.append({'key': key, 'label': self._labels[dimension][key], 'count': count})
+                values.sort(key=lambda value: (-value['count'], value['key']))
+                facets[dimension] = values[:limit]
+
+            return mask_without(None).bit_count(), facets
+
+facet_index = FacetIndex()
+on_catalog_change(facet_index.apply)
@@ -0,0 +1,244 @@
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from ..models.user import db
+from ..models.catalog import on_catalog_change, on_rating_change, CatalogChangeWatcher
+from ..models.geo import EARTH_RADIUS_KM
+
+DEFAULT_RANKING_WEIGHTS = {
+    'text': 3.0,      # full-text / fuzzy match strength, normalized to 0-1 within the candidates
+    'rating': 1.0,    # average rating / 5
+    'reviews': 1.0,   # log review volume relative to the most reviewed business
+    'verified': 0.5,
+    'distance': 2.0,  # exp(-distance / DISTANCE_SCALE_KM), when a location is given
+    'premium': 1.5,   # active business_premium / business_enterprise subscription
+}
+DISTANCE_SCALE_KM = 10.0
+PREMIUM_PLANS = ('business_premium', 'business_enterprise')
+PREMIUM_REFRESH_SECONDS = 300
+
+def ranking_weights():
+    """Default weights overridden by the app's RANKING_WEIGHTS config"""
+    weights = dict(DEFAULT_RANKING_WEIGHTS)
+    weights.update(current_app.config.get('RANKING_WEIGHTS', {}))
+    return weights
+
+class RankingFeatures:
+    """Per-business ranking features as NumPy arrays.
+
+    Each business has a fixed slot in the arrays; `_positions` maps ids to
+    slots. Scoring a candidate set gathers its slots and computes every
+    feature and the weighted sum in vectorized passes. Business edits and
+    review writes update slots in place, and so do subscription changes
+    (their triggers log the business, see init_catalog_version); premium
+    placement is also re-read from subscriptions every
+    PREMIUM_REFRESH_SECONDS, for plans that ran out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._positions = {}
+        self._size = 0
+        self._premium_loaded_at = 0
+        self._changes = CatalogChangeWatcher()
+        self._allocate(0)
+
+    def _allocate(self, capacity):
+        self.review_count = np.zeros(capacity, dtype=np.float64)
+        self.rating_sum = np.zeros(capacity, dtype=np.float64)
+        self.verified = np.zeros(capacity, dtype=bool)
+        self.premium = np.zeros(capacity, dtype=bool)
+        self.latitude = np.full(capacity, np.nan)
+        self.longitude = np.full(capacity, np.nan)
+
+    def _grow(self, needed):
+        capacity = len(self.review_count)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        for name in ('review_count', 'rating_sum', 'verified', 'premium', 'latitude', 'longitude'):
+            old = getattr(self, name)
+            fill = np.nan if name in ('latitude', 'longitude') else 0
+            grown = np.full(new_capacity, fill, dtype=old.dtype)
+            grown[:capacity] = old
+            setattr(self, name, grown)
+
+    @staticmethod
+    def _fetch(ids=None):
+        from ..models.business import Business
+
+        businesses = Business.__table__
+        query = db.select(
+            businesses.c.id, businesses.c.review_count, businesses.c.rating_sum,
+            businesses.c.is_verified, businesses.c.latitude, businesses.c.longitude
+        )
+        if ids is not None:
+            query = query.where(businesses.c.id.in_(ids))
+        # Own connection: this also runs from after_commit hooks, where the
+        # session can't emit SQL
+        with db.engine.connect() as connection:
+            return connection.execute(query).all()
+
+    def _store(self, row):
+        position = self._positions.get(row.id)
+        if position is None:
+            position = self._size
+            self._grow(position + 1)
+            self._positions[row.id] = position
+            self._size += 1
+        self.review_count[position] = row.review_count or 0
+        self.rating_sum[position] = row.rating_sum or 0
+        self.verified[position] = bool(row.is_verified)
+        self.latitude[position] = np.nan if row.latitude is None else row.latitude
+        self.longitude[position] = np.nan if row.longitude is None else row.longitude
+
+    def load(self):
+        """(Re)build the feature arrays from the catalog"""
+        self._changes.mark_loaded()
+        rows = self._fetch()
+        with self._lock:
+            self._positions = {}
+            self._size = 0
+            self._allocate(len(rows))
+            for row in rows:
+                self._store(row)
+            self._loaded = True
+        self._load_premium()
+
+    @staticmethod
+    def _premium_ids(ids=None):
+        """Ids of the businesses (of `ids`, None for all) with a running premium plan"""
+        from ..models.subscription import Subscription
+
+        now = datetime.utcnow()
+        query = db.select(Subscription.business_id).where(
+            Subscription.business_id.isnot(None),
+            Subscription.status == 'active',
+            Subscription.subscription_type.in_(PREMIUM_PLANS),
+            db.or_(Subscription.current_period_end > now, Subscription.trial_end > now)
+        )
+        if ids is not None:
+            query = query.where(Subscription.business_id.in_(ids))
+        with db.engine.connect() as connection:
+            return set(connection.execute(query).scalars())
+
+    def _load_premium(self):
+        premium = self._premium_ids()
+        with self._lock:
+            self.premium[:] = False
+            positions = [self._positions[business_id] for business_id in premium if business_id in self._positions]
+            self.premium[positions] = True
+            self._premium_loaded_at = time.monotonic()
+
+    def refresh(self, business_ids):
+        """Re-read the features of some businesses"""
+        with self._lock:
+            if not self._loaded:
+                return
+        business_ids = list(business_ids)
+        rows = self._fetch(business_ids)
+        premium = self._premium_ids(business_ids)
+        with self._lock:
+            for row in rows:
+                self._store(row)
+                self.premium[self._positions[row.id]] = row.id in premium
+
+    def apply(self, upserted, deleted_ids):
+        """Apply committed business changes (deleted slots are just left unused)"""
+        with self._lock:
+            if not self._loaded:
+                return
+            for business_id in deleted_ids:
+                self._positions.pop(business_id, None)
+        if upserted:
+            self.refresh([business['id'] for business in upserted])
+
+    def score(self, ids, text_scores=None, lat=None, lng=None, weights=None):
+        """Score candidate businesses in one vectorized pass.
+
+        `text_scores` holds a raw match strength per candidate (higher is
+        better). Returns (ids, scores, components) for the candidates that
+        are in the index, where `components` maps each feature to its
+        weighted contribution.
+        """
+        if not self._loaded or self._changes.stale():
+            self.load()
+        elif time.monotonic() - self._premium_loaded_at > PREMIUM_REFRESH_SECONDS:
+            self._load_premium()
+        weights = weights or ranking_weights()
+
+        with self._lock:
+            ids = np.asarray(ids, dtype=np.int64)
+            positions = np.fromiter((self._positions.get(i, -1) for i in ids.tolist()), dtype=np.int64, count=len(ids))
+            known = positions >= 0
+            ids, positions = ids[known], positions[known]
+
+            review_count = self.review_count[positions]
+            rating_sum = self.rating_sum[positions]
+            latitude = self.latitude[positions]
+            longitude = self.longitude[positions]
+            features = {
+                'rating': np.divide(rating_sum, review_count * 5, out=np.zeros(len(ids)), where=review_count > 0),
+                'verified': self.verified[positions].astype(np.float64),
+                'premium': self.premium[positions].astype(np.float64),
+            }
+
+        max_reviews = review_count.max() if len(ids) else 0
+        features['reviews'] = np.log1p(review_count) / np.log1p(max_reviews) if max_reviews else np.zeros(len(ids))
+
+        if text_scores is not None:
+            text = np.asarray(text_scores, dtype=np.float64)[known]
+            top = text.max() if len(text) else 0
+            features['text'] = text / top if top > 0 else np.zeros(len(ids))
+        else:
+            features['text'] = np.zeros(len(ids))
+
+        if lat is not None and lng is not None:
+            phi1, phi2 = np.radians(lat), np.radians(latitude)
+            dphi = phi2 - phi1
+            dlambda = np.radians(longitude - lng)
+            a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+            distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+            features['distance'] = np.nan_to_num(np.exp(-distance_km / DISTANCE_SCALE_KM), nan=0.0)
+        else:
+            features['distance'] = np.zeros(len(ids))
+
+        components = {name: weights.get(name, 0.0) * values for name, values in features.items()}
+        scores = np.sum(list(components.values()), axis=0) if len(ids) else np.zeros(0)
+        return ids, scores, components
+
+ranking_features = RankingFeatures()
+on_catalog_change(ranking_features.apply)
+on_rating_change(ranking_features.refresh)
+
+def rank_page(ids, cursor_key=None, per_page=20, **score_args):
+    """Score candidates and return one page ordered by score (then id).
+
+    `cursor_key` is the (negated score, id) of the last row of the
+    previous page. Returns (page_ids, explanations, next_key) where
+    `explanations` maps each page id to its score breakdown.
+    """
+    ids, scores, components = ranking_features.score(ids, **score_args)
+    negated = -np.round(scores, 9)
+
+    if cursor_key is not None:
+        after = (negated > cursor_key[0]) | ((negated == cursor_key[0]) & (ids > cursor_key[1]))
+        ids, negated = ids[after], negated[after]
+        components = {name: values[after] for name, values in components.items()}
+
+    order = np.lexsort((ids, negated))[:per_page + 1]
+    next_key = None
+    if len(order) > per_page:
+        order = order[:per_page]
+        last = order[-1]
+        next_key = (float(negated[last]), int(ids[last]))
+
+    explanations = {
+        int(ids[i]): dict({name: round(float(values[i]), 4) for name, values in components.items()},
+                          score=round(float(-negated[i]), 4))
+        for i in order
+    }
+    return [int(ids[i]) for i in order], explanations, next_key
@@ -0,0 +1,183 @@
+import re
+import sys
+import threading
+from bisect import bisect_left, insort
+from ..models.user import db
+from ..models.catalog import on_catalog_change, CatalogChangeWatcher
+
+MAX_NAME_ENTRIES = 500000
+WORDS_PER_NAME = 4  # a name is also findable from its 2nd..4th word
+SHORT_PREFIX = 2  # prefixes up to this length get a cached top-N
+
+def normalize(text):
+    """Lowercase, drop apostrophes, turn other punctuation into spaces"""
+    text = re.sub(r"['’]", '', (text or '').lower())
+    return ' '.join(re.findall(r'\w+', text))
+
+def _name_keys(name):
+    words = normalize(name).split()
+    return [' '.join(words[i:]) for i in range(min(len(words), WORDS_PER_NAME))]
+
+class SuggestIndex:
+    """In-memory prefix index for typeahead over names, cities and categories.
+
+    Entries live in sorted lists of (key, kind, ref, label, weight) tuples;
+    a lookup is a bisect to the first key with the prefix and a bounded
+    scan. Business names are updated incrementally from committed catalog
+    changes; cities and categories are reloaded from business_dimensions
+    (a small table) on the next lookup after a change. Very short prefixes
+    match a large share of the catalog, so their top-N is cached until the
+    next change.
+    """
+
+    def __init__(self, max_name_entries=MAX_NAME_ENTRIES):
+        self.max_name_entries = max_name_entries
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._names = []
+        self._name_keys = {}  # business id -> (keys, label, weight)
+        self._dimensions = []
+        self._dimensions_stale = True
+        self._short_prefix_cache = {}
+        self.truncated = 0
+        self._changes = CatalogChangeWatcher()
+
+    def load(self):
+        """(Re)build the index from the catalog"""
+        from ..models.business import Business
+
+        self._changes.mark_loaded()
+        businesses = Business.__table__
+        rows = db.session.execute(db.select(
+            businesses.c.id, businesses.c.name, businesses.c.review_count
+        )).all()
+
+        with self._lock:
+            self._names = []
+            self._name_keys = {}
+            self.truncated = 0
+            for row in rows:
+                self._add_name(row.id, row.name, row.review_count or 0, sort=False)
+            self._names.sort()
+            self._dimensions_stale = True
+            self._short_prefix_cache = {}
+            self._loaded = True
+
+    def _load_dimensions(self):
+        from ..models.dimension import BusinessDimension
+
+        rows = db.session.query(
+            BusinessDimension.dimension, BusinessDimension.key,
+            BusinessDimension.label, BusinessDimension.business_count
+        ).filter(
+            BusinessDimension.dimension.in_(('city', 'category')),
+            BusinessDimension.business_count > 0
+        ).all()
+        entries = sorted(
+            (normalize(label), dimension, key, label, count)
+            for dimension, key, label, count in rows
+        )
+        with self._lock:
+            self._dimensions = entries
+            self._dimensions_stale = False
+
+    def _add_name(self, business_id, name, weight, sort=True):
+        keys = [key for key in _name_keys(name) if key]
+        if len(self._names) + len(keys) > self.max_name_entries:
+            self.truncated += 1
+            return
+        self._name_keys[business_id] = (keys, name, weight)
+        for key in keys:
+            entry = (key, 'business', business_id, name, weight)
+            if sort:
+                insort(self._names, entry)
+            else:
+                self._names.append(entry)
+
+    def _remove_name(self, business_id):
+        keys, name, weight = self._name_keys.pop(business_id, ((), None, None))
+        for key in keys:
+            position = bisect_left(self._names, (key, 'business', business_id))
+            if position < len(self._names) and self._names[position][:3] == (key, 'business', business_id):
+                del self._names[position]
+
+    def apply(self, upserted, deleted_ids):
+        """Apply committed business changes"""
+        with self._lock:
+            self._dimensions_stale = True
+            self._short_prefix_cache = {}
+            if not self._loaded:
+                return
+            for business_id in list(deleted_ids) + [b['id'] for b in upserted]:
+                self._remove_name(business_id)
+            for business in upserted:
+                self._add_name(business['id'], business['name'], business.get('review_count') or 0)
+
+    @staticmethod
+    def _scan(entries, prefix, scan_limit):
+        position = bisect_left(entries, (prefix,))
+        matches = []
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            matches.append(entries[position])
+            position += 1
+            if scan_limit and len(matches) >= scan_limit:
+                break
+        return matches
+
+    def suggest(self, query, limit=8, scan_limit=200):
+        """Top `limit` suggestions whose name/city/category starts with `query`"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if not self._loaded or self._changes.stale():
+            self.load()
+        if self._dimensions_stale:
+            self._load_dimensions()
+
+        with self._lock:
+            cached = self._short_prefix_cache.get((prefix, limit))
+            if cached is not None:
+                return cached
+
+            # Short prefixes scan their whole range once, then hit the cache
+            bound = None if len(prefix) <= SHORT_PREFIX else scan_limit
+            candidates = self._scan(self._names, prefix, bound) + self._scan(self._dimensions, prefix, bound)
+
+            seen = set()
+            suggestions = []
+            for key, kind, ref, label, weight in sorted(candidates, key=lambda e: (-e[4], e[0])):
+                if (kind, ref) in seen:
+                    continue
+                seen.add((kind, ref))
+                suggestion = {'type': kind, 'label': label}
+                if kind == 'business':
+                    suggestion['id'] = ref
+                else:
+                    suggestion['key'] = ref
+                    suggestion['business_count'] = weight
+                suggestions.append(suggestion)
+                if len(suggestions) >= limit:
+                    break
+
+            if len(prefix) <= SHORT_PREFIX:
+                self._short_prefix_cache[(prefix, limit)] = suggestions
+            return suggestions
+
+    def stats(self):
+        """Entry counts and approximate memory use of the index"""
+        with self._lock:
+            entries = self._names + self._dimensions
+            size = sys.getsizeof(self._names) + sys.getsizeof(self._dimensions) + sys.getsizeof(self._name_keys)
+            # Labels are shared with the name map; count keys and tuples only
+            size += sum(sys.getsizeof(entry) + sys.getsizeof(entry[0]) for entry in entries)
+            return {
+                'loaded': self._loaded,
+                'name_entries': len(self._names),
+                'dimension_entries': len(self._dimensions),
+                'max_name_entries': self.max_name_entries,
+                'truncated_businesses': self.truncated,
+                'approx_memory_bytes': size
+            }
+
+suggest_index = SuggestIndex()
+on_catalog_change(suggest_index.apply)
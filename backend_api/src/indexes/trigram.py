@@ -0,0 +1,147 @@
+import threading
+from collections import Counter
+from ..models.user import db
+from ..models.catalog import on_catalog_change, CatalogChangeWatcher
+from ..models.dimension import canonical_key
+from .suggest import normalize
+
+SIMILARITY_THRESHOLD = 0.3
+
+def word_trigrams(text):
+    """Trigram set of each word of a string, padded like pg_trgm"""
+    words = []
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        words.append(frozenset(padded[i:i + 3] for i in range(len(padded) - 2)))
+    return words
+
+def word_similarity(query, words, query_words=1):
+    """Best trigram similarity |A & B| / |A | B| of `query` to a run of consecutive `words`.
+
+    Like pg_trgm's word_similarity, a short query is compared with the part
+    of a longer text that matches it best ("jazz" is a perfect match for
+    "Rochester Jazz Lounge") rather than with the whole text. Runs are up
+    to one word longer than the query.
+    """
+    best = 0.0
+    for width in range(1, min(len(words), query_words + 1) + 1):
+        for start in range(len(words) - width + 1):
+            window = frozenset().union(*words[start:start + width])
+            shared = len(query & window)
+            if shared:
+                best = max(best, shared / (len(query) + len(window) - shared))
+    return best
+
+class TrigramIndex:
+    """Inverted index from trigrams to the refs whose text contains them.
+
+    Candidates for a fuzzy lookup are only the refs sharing enough
+    trigrams with the query (counted over its posting lists), scored by
+    word_similarity; the rest of the catalog is never visited.
+    """
+
+    def __init__(self, loader, extract):
+        self._loader = loader  # () -> iterable of (ref, text)
+        self._extract = extract  # business column-value dict -> (ref, text) or None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._postings = {}
+        self._grams = {}
+        self._words = {}
+        self._changes = CatalogChangeWatcher()
+
+    def load(self):
+        """(Re)build the index"""
+        self._changes.mark_loaded()
+        entries = list(self._loader())
+        with self._lock:
+            self._postings = {}
+            self._grams = {}
+            self._words = {}
+            for ref, text in entries:
+                self._add(ref, text)
+            self._loaded = True
+
+    def _add(self, ref, text):
+        words = word_trigrams(text)
+        if not words:
+            return
+        grams = frozenset().union(*words)
+        self._grams[ref] = grams
+        self._words[ref] = words
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(ref)
+
+    def _remove(self, ref):
+        self._words.pop(ref, None)
+        for gram in self._grams.pop(ref, ()):
+            postings = self._postings[gram]
+            postings.discard(ref)
+            if not postings:
+                del self._postings[gram]
+
+    def apply(self, upserted, deleted_ids):
+        """Apply committed business changes"""
+        with self._lock:
+            if not self._loaded:
+                return
+            for business_id in deleted_ids:
+                self._remove(business_id)
+            for business in upserted:
+                entry = self._extract(business)
+                if entry is not None:
+                    self._remove(entry[0])
+                    self._add(*entry)
+
+    def search(self, text, threshold=SIMILARITY_THRESHOLD, limit=200):
+        """[(ref, similarity)] for refs at least `threshold` similar, best first"""
+        if not self._loaded or self._changes.stale():
+            self.load()
+
+        query_words = word_trigrams(text)
+        if not query_words:
+            return []
+        query = frozenset().union(*query_words)
+
+        with self._lock:
+            shared = Counter()
+            for gram in query:
+                shared.update(self._postings.get(gram, ()))
+
+            matches = []
+            for ref, count in shared.items():
+                # No run of words can score more than count / len(query)
+                if count < threshold * len(query):
+                    continue
+                similarity = word_similarity(query, self._words[ref], len(query_words))
+                if similarity >= threshold:
+                    matches.append((ref, similarity))
+
+        matches.sort(key=lambda match: (-match[1], str(match[0])))
+        return matches[:limit]
+
+def _load_names():
+    from ..models.business import Business
+
+    businesses = Business.__table__
+    return db.session.execute(db.select(businesses.c.id, businesses.c.name)).all()
+
+def _load_cities():
+    from ..models.business import Business
+
+    businesses = Business.__table__
+    rows = db.session.execute(db.select(businesses.c.city_key).distinct()).all()
+    return [(city_key, city_key) for city_key, in rows if city_key]
+
+# Business names, keyed by business id
+name_index = TrigramIndex(_load_names, lambda b: (b['id'], b['name']))
+
+# Canonical city names; cities are only ever added, a city that no longer
+# has businesses just matches nothing
+city_index = TrigramIndex(_load_cities, lambda b: (canonical_key(b['city']),) * 2 if b['city'] else None)
+
+on_catalog_change(name_index.apply)
+
+@on_catalog_change
+def _apply_cities(upserted, deleted_ids):
+    city_index.apply(upserted, ())
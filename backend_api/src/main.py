@@ -3,11 +3,20 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, jsonify, request
+from flask import Flask, send_from_directory, jsonify, request, redirect, url_for
 from flask_cors import CORS
 from src.models.user import db
-from src.models.business import Business
+from src.models.business import Business, refresh_rating_aggregates
 from src.models.review import Review
+from src.models.dimension import canonical_key, refresh_dimensions
+from src.models.slug import refresh_slugs, resolve_slug
+from src.models.schema import add_missing_columns, run_migrations
+from src.models import analytics, subscription  # tables and indexes for create_all / migrations
+from src.models.search import init_search_index
+from src.models.geo import init_geo_index
+from src.models.catalog import init_catalog_version
+from src.utils.pagination import keyset_paginate
+from src.utils.http_cache import cached_read
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -23,6 +32,17 @@ db.init_app(app)
 # Create tables
 with app.app_context():
     db.create_all()
+    added_columns = add_missing_columns()
+    run_migrations()
+    if 'businesses.rating_sum' in added_columns:
+        refresh_rating_aggregates()
+    if 'businesses.city_key' in added_columns:
+        refresh_dimensions()
+    if 'businesses.slug' in added_columns:
+        refresh_slugs()
+    init_search_index()
+    init_geo_index()
+    init_catalog_version()
     
     # Add sample data if database is empty
     if Business.query.count() == 0:
@@ -127,6 +147,7 @@ with app.app_context():
 
 # API Routes
 @app.route('/api/businesses')
+@cached_read
 def get_businesses():
     try:
         city = request.args.get('city', '')
@@ -136,19 +157,28 @@ def get_businesses():
         query = Business.query
         
         if city:
-            query = query.filter(Business.city.ilike(f'%{city}%'))
+            query = query.filter(Business.city_key == canonical_key(city))
         if state:
-            query = query.filter(Business.state.ilike(f'%{state}%'))
+            query = query.filter(Business.state_key == canonical_key(state))
         if category:
-            query = query.filter(Business.category.ilike(f'%{category}%'))
+            query = query.filter(Business.category_key == canonical_key(category))
             
-        businesses = query.all()
+        page = keyset_paginate(
+            query,
+            [Business.id],
+            cursor=request.args.get('cursor'),
+            per_page=request.args.get('per_page', 50, type=int),
+            include_total=request.args.get('include_total', 'true').lower() != 'false'
+        )
         
+        data = page.to_dict('businesses')
+        data['success'] = True
+        return jsonify(data)
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'businesses': [business.to_dict() for business in businesses],
-            'total': len(businesses)
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -156,6 +186,7 @@ def get_businesses():
         }), 500
 
 @app.route('/api/businesses/<int:business_id>')
+@cached_read
 def get_business(business_id):
     try:
         business = Business.query.get_or_404(business_id)
@@ -169,6 +200,28 @@ def get_business(business_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/businesses/by-slug/<slug>')
+@cached_read
+def get_business_by_slug(slug):
+    try:
+        business, redirected = resolve_slug(slug)
+        if business is None:
+            return jsonify({
+                'success': False,
+                'error': 'Business not found'
+            }), 404
+        if redirected:
+            return redirect(url_for('get_business_by_slug', slug=business.slug), 301)
+        return jsonify({
+            'success': True,
+            'business': business.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/user/<int:user_id>/subscriptions')
 def get_user_subscriptions(user_id):
     # Mock subscription data for demo
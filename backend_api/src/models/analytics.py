@@ -1,9 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from .user import db
+import os
+from datetime import datetime, date, timedelta
+from sqlalchemy import inspect
+from sqlalchemy.orm import deferred
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import numpy as np
+from .user import db, User
+from .partition import MonthlyPartitions, month_of, next_month
+from .subscription import Subscription, PaymentHistory, BUSINESS_SUBSCRIPTION_TYPES
+from ..utils.columnar import column_dtype, to_array
 
 class UserActivity(db.Model):
     __tablename__ = 'user_activities'
+    __table_args__ = (
+        db.Index('ix_user_activities_timestamp', 'timestamp'),
+        db.Index('ix_user_activities_business_timestamp', 'business_id', 'timestamp'),
+        db.Index('ix_user_activities_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Nullable for anonymous users
@@ -49,8 +62,14 @@ class UserActivity(db.Model):
             'duration': self.duration
         }
 
+# Daily BusinessAnalytics columns that are incremented from tracked events
+DAILY_COUNTERS = ('profile_views', 'phone_clicks', 'website_clicks', 'direction_requests', 'favorites_added')
+
 class BusinessAnalytics(db.Model):
     __tablename__ = 'business_analytics'
+    __table_args__ = (
+        db.Index('ix_business_analytics_business_date', 'business_id', 'date', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     business_id = db.Column(db.Integer, db.ForeignKey('businesses.id'), nullable=False)
@@ -67,12 +86,18 @@ class BusinessAnalytics(db.Model):
     direction_requests = db.Column(db.Integer, default=0)
     favorites_added = db.Column(db.Integer, default=0)
     
+    # HyperLogLog sketch of the day's visitors (see src/utils/hll.py);
+    # unique_visitors is its estimate. Deferred: only range counts need it
+    visitor_sketch = deferred(db.Column(db.LargeBinary, nullable=True))
+    
     # Review metrics
     reviews_received = db.Column(db.Integer, default=0)
     average_rating = db.Column(db.Float, default=0.0)
     
     # Search metrics
     search_ranking_avg = db.Column(db.Float, default=0.0)
+    # Superseded by business_category_rankings; kept for the existing
+    # schema and the daily_analytics payload
     category_ranking = db.Column(db.Integer, default=0)
     
     # Relationships
@@ -97,7 +122,11 @@ class BusinessAnalytics(db.Model):
         }
 
 class PlatformMetrics(db.Model):
+    """One row per closed UTC day, written by rollup_platform_metrics()"""
     __tablename__ = 'platform_metrics'
+    __table_args__ = (
+        db.Index('ix_platform_metrics_date', 'date', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -142,6 +171,10 @@ class PlatformMetrics(db.Model):
 
 class SearchAnalytics(db.Model):
     __tablename__ = 'search_analytics'
+    __table_args__ = (
+        db.Index('ix_search_analytics_search_time', 'search_time'),
+        db.Index('ix_search_analytics_clicked_business_time', 'clicked_business_id', 'search_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -179,3 +212,394 @@ class SearchAnalytics(db.Model):
             'search_time': self.search_time.isoformat() if self.search_time else None
         }
 
+# Tracked events are stored in monthly partitions of these tables (the
+# tables themselves only serve as the template)
+activity_partitions = MonthlyPartitions(UserActivity, 'timestamp')
+search_partitions = MonthlyPartitions(SearchAnalytics, 'search_time')
+
+
+# Additive BusinessAnalytics columns, summed when duplicate daily rows are merged
+_SUMMED_COLUMNS = DAILY_COUNTERS + ('unique_visitors', 'search_appearances', 'reviews_received')
+
+def merge_duplicate_business_analytics():
+    """Fold duplicate (business_id, date) rows into their oldest row.
+
+    Rows written before the unique index existed can repeat a day; they
+    must be merged before the index can be created. Does nothing once the
+    index exists. Returns the number of rows removed.
+    """
+    index_name = 'ix_business_analytics_business_date'
+    inspector = inspect(db.engine)
+    if 'business_analytics' not in inspector.get_table_names():
+        return 0
+    if index_name in {index['name'] for index in inspector.get_indexes('business_analytics')}:
+        return 0
+
+    table = BusinessAnalytics.__table__
+    other = table.alias('other')
+    same_day = db.and_(other.c.business_id == table.c.business_id, other.c.date == table.c.date)
+    keepers = db.select(db.func.min(table.c.id)).group_by(table.c.business_id, table.c.date)
+    duplicated = keepers.having(db.func.count() > 1)
+
+    db.session.execute(table.update().where(table.c.id.in_(duplicated)).values({
+        column: db.select(db.func.sum(db.func.coalesce(other.c[column], 0))).where(same_day).scalar_subquery()
+        for column in _SUMMED_COLUMNS
+    }))
+    removed = db.session.execute(table.delete().where(table.c.id.not_in(keepers))).rowcount
+    db.session.commit()
+    return removed
+
+RANKING_WINDOW_DAYS = 30
+
+class BusinessCategoryRanking(db.Model):
+    """Latest rank of each business within its category (see refresh_category_rankings)"""
+    __tablename__ = 'business_category_rankings'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id'), primary_key=True)
+    rank = db.Column(db.Integer, nullable=False)
+    ranked_on = db.Column(db.Date, nullable=False)
+
+def refresh_category_rankings(today=None):
+    """Rank every business within its category and replace the stored rankings.
+
+    The score is profile views plus search appearances over the last
+    RANKING_WINDOW_DAYS; one INSERT ... SELECT computes it with a grouped
+    aggregate and RANK() OVER (PARTITION BY category) into
+    business_category_rankings, a row per business. Run by
+    refresh_rankings.py; returns the number of businesses ranked.
+    """
+    from .business import Business
+
+    today = today or datetime.utcnow().date()
+    businesses = Business.__table__
+    table = BusinessAnalytics.__table__
+    recent = db.and_(table.c.business_id == businesses.c.id,
+                     table.c.date >= today - timedelta(days=RANKING_WINDOW_DAYS))
+    scores = db.select(
+        businesses.c.id,
+        businesses.c.category_key,
+        db.func.coalesce(db.func.sum(
+            db.func.coalesce(table.c.profile_views, 0) + db.func.coalesce(table.c.search_appearances, 0)
+        ), 0).label('score')
+    ).select_from(businesses.outerjoin(table, recent)).group_by(businesses.c.id).subquery()
+    ranked = db.select(
+        scores.c.id,
+        db.func.rank().over(partition_by=scores.c.category_key, order_by=scores.c.score.desc()),
+        db.literal(today, db.Date)
+    )
+
+    rankings = BusinessCategoryRanking.__table__
+    db.session.execute(rankings.delete())
+    ranked_count = db.session.execute(
+        rankings.insert().from_select(['business_id', 'rank', 'ranked_on'], ranked)
+    ).rowcount
+    db.session.commit()
+    return ranked_count
+
+def category_rank(business_id):
+    """(rank, ranking date) of a business in its category, None if unranked"""
+    row = db.session.execute(
+        db.select(BusinessCategoryRanking.rank, BusinessCategoryRanking.ranked_on)
+        .where(BusinessCategoryRanking.business_id == business_id)
+    ).first()
+    return tuple(row) if row else None
+
+# A day is rolled up once it ended this long ago, so events still queued
+# for ingestion (src/utils/ingest.py) at midnight are counted in it
+PLATFORM_ROLLUP_DELAY = timedelta(minutes=5)
+PLATFORM_ROLLUP_CHUNK_DAYS = 31
+
+def _by_day(column, aggregate, start, end, *criteria):
+    """{day: aggregate} of the rows with start <= column < end, by UTC day"""
+    day = db.func.date(column).label('day')
+    rows = db.session.execute(
+        db.select(day, aggregate).where(column >= start, column < end, *criteria).group_by(day)
+    )
+    return {date.fromisoformat(d): value for d, value in rows}
+
+def _count_before(column, moment):
+    # Rows without a timestamp predate the column being filled in
+    return db.session.execute(
+        db.select(db.func.count()).where(db.or_(column < moment, column.is_(None)))
+    ).scalar()
+
+# SQLite allows 500 terms in a compound SELECT
+_MOMENTS_PER_QUERY = 400
+
+def _subscribers_at(moments):
+    """{moment: (premium users, premium businesses)} with a subscription running at each moment.
+
+    One grouped query (per _MOMENTS_PER_QUERY moments): the moments are a
+    UNION ALL of literals joined to the subscriptions that cover them.
+    """
+    counts = {}
+    for first in range(0, len(moments), _MOMENTS_PER_QUERY):
+        at = db.union_all(*[
+            db.select(db.literal(value, db.DateTime).label('moment'))
+            for value in moments[first:first + _MOMENTS_PER_QUERY]
+        ]).subquery('moments')
+        running = db.and_(
+            Subscription.created_at < at.c.moment,
+            db.or_(Subscription.cancelled_at.is_(None), Subscription.cancelled_at >= at.c.moment),
+            db.or_(Subscription.current_period_end >= at.c.moment, Subscription.trial_end >= at.c.moment)
+        )
+        rows = db.session.execute(
+            db.select(
+                at.c.moment,
+                db.func.count(db.distinct(db.case(
+                    (Subscription.subscription_type == 'user_premium', Subscription.user_id)
+                ))),
+                db.func.count(db.distinct(db.case(
+                    (Subscription.subscription_type.in_(BUSINESS_SUBSCRIPTION_TYPES), Subscription.business_id)
+                )))
+            ).select_from(at.join(Subscription, running)).group_by(at.c.moment)
+        )
+        counts.update((value, (users, businesses)) for value, users, businesses in rows)
+    return {value: counts.get(value, (0, 0)) for value in moments}
+
+def compute_platform_metrics(start, end):
+    """PlatformMetrics column values for each UTC day from `start` up to `end`.
+
+    `start` is a date, `end` a datetime; a day cut short by `end` (today)
+    covers what happened before it, and its totals are as of `end`. Each
+    metric is one grouped query over the range, not one per day.
+    Returns {day: {column: value}}.
+    """
+    from .business import Business
+    from .review import Review
+
+    begin = datetime.combine(start, datetime.min.time())
+    day_count = (end - begin).days
+    if end > begin + timedelta(days=day_count):
+        day_count += 1
+    days = [start + timedelta(days=offset) for offset in range(day_count)]
+    count = db.func.count()
+
+    new_users = _by_day(User.created_at, count, begin, end)
+    new_businesses = _by_day(Business.created_at, count, begin, end)
+    searched = search_partitions.union(begin, end)
+    searches = _by_day(searched.c.search_time, count, begin, end)
+    viewed = activity_partitions.union(begin, end, where=lambda table: [table.c.activity_type == 'view_business'])
+    views = _by_day(viewed.c.timestamp, count, begin, end)
+    reviews = _by_day(Review.created_at, count, begin, end)
+    succeeded = PaymentHistory.status == 'succeeded'
+    revenue = _by_day(PaymentHistory.payment_date, db.func.sum(PaymentHistory.amount), begin, end, succeeded)
+    subscription_revenue = _by_day(PaymentHistory.payment_date, db.func.sum(PaymentHistory.amount), begin, end,
+                                   succeeded, PaymentHistory.subscription_id.is_not(None))
+
+    # Signed-in users seen in tracked activity or searches (the union
+    # dedupes each user's day)
+    signed_in = lambda table: [table.c.user_id.is_not(None)]
+    acted = activity_partitions.union(begin, end, where=signed_in)
+    searched = search_partitions.union(begin, end, where=signed_in)
+    seen = db.union(
+        db.select(acted.c.user_id.label('user_id'), db.func.date(acted.c.timestamp).label('day')),
+        db.select(searched.c.user_id, db.func.date(searched.c.search_time))
+    ).subquery()
+    active_users = {date.fromisoformat(d): n for d, n in db.session.execute(
+        db.select(seen.c.day, count).group_by(seen.c.day)
+    )}
+
+    # Subscription state is taken at the end of each day
+    day_ends = [min(datetime.combine(day + timedelta(days=1), datetime.min.time()), end) for day in days]
+    subscribers = _subscribers_at(day_ends)
+
+    total_users = _count_before(User.created_at, begin)
+    total_businesses = _count_before(Business.created_at, begin)
+    metrics = {}
+    for day, day_end in zip(days, day_ends):
+        total_users += new_users.get(day, 0)
+        total_businesses += new_businesses.get(day, 0)
+        premium_users, premium_businesses = subscribers[day_end]
+        metrics[day] = {
+            'total_users': total_users,
+            'new_users': new_users.get(day, 0),
+            'active_users': active_users.get(day, 0),
+            'premium_users': premium_users,
+            'total_businesses': total_businesses,
+            'new_businesses': new_businesses.get(day, 0),
+            'premium_businesses': premium_businesses,
+            'total_searches': searches.get(day, 0),
+            'total_views': views.get(day, 0),
+            'total_reviews': reviews.get(day, 0),
+            'daily_revenue': float(revenue.get(day) or 0.0),
+            'subscription_revenue': float(subscription_revenue.get(day) or 0.0),
+        }
+    return metrics
+
+def _first_metrics_day():
+    """The first day with any raw data, None for an empty database"""
+    from .business import Business
+
+    firsts = [db.session.execute(db.select(db.func.min(column))).scalar() for column in (
+        User.created_at, Business.created_at, PaymentHistory.payment_date
+    )]
+    firsts += [activity_partitions.first_time(), search_partitions.first_time()]
+    firsts = [first for first in firsts if first is not None]
+    return min(firsts).date() if firsts else None
+
+def last_closed_day(now=None):
+    """The latest UTC day that can be rolled up"""
+    now = now or datetime.utcnow()
+    return (now - PLATFORM_ROLLUP_DELAY).date() - timedelta(days=1)
+
+def platform_metrics_watermark():
+    """The last day in platform_metrics, None before the first rollup.
+
+    Rollup rows are written in the same transaction that advances it, so
+    every day up to the watermark is complete.
+    """
+    return db.session.execute(db.select(db.func.max(PlatformMetrics.date))).scalar()
+
+def rollup_platform_metrics(now=None):
+    """Write the platform_metrics rows of the closed days after the watermark.
+
+    Each day is computed once from the raw tables after it has closed, so
+    a rerun only picks up new days. The first run backfills from the first
+    day with data, committing PLATFORM_ROLLUP_CHUNK_DAYS at a time. Returns
+    the number of days written.
+    """
+    last_day = last_closed_day(now)
+    watermark = platform_metrics_watermark()
+    start = watermark + timedelta(days=1) if watermark else _first_metrics_day()
+    if start is None or start > last_day:
+        return 0
+
+    table = PlatformMetrics.__table__
+    written = 0
+    while start <= last_day:
+        stop = min(start + timedelta(days=PLATFORM_ROLLUP_CHUNK_DAYS - 1), last_day)
+        metrics = compute_platform_metrics(start, datetime.combine(stop + timedelta(days=1), datetime.min.time()))
+        statement = sqlite_insert(table)
+        # A concurrent run computes the same values for a day
+        statement = statement.on_conflict_do_update(
+            index_elements=['date'],
+            set_={column: statement.excluded[column] for column in metrics[start]}
+        )
+        db.session.execute(statement, [dict(values, date=day) for day, values in metrics.items()])
+        db.session.commit()
+        written += len(metrics)
+        start = stop + timedelta(days=1)
+    return written
+
+# Full months of raw events kept before the current one; older months are
+# archived once platform_metrics has rolled them up
+RAW_EVENT_RETENTION_MONTHS = 3
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'archive')
+
+def archive_raw_events(directory=ARCHIVE_DIR, keep_months=RAW_EVENT_RETENTION_MONTHS, now=None):
+    """Archive and drop the event partitions that are past retention.
+
+    Each month older than the last `keep_months` full months is written to
+    a gzip JSONL file under `directory` and its table dropped, one month
+    per transaction. A month is only archived after every one of its days
+    has been rolled up into platform_metrics (business counters and
+    visitor sketches are updated as events arrive). Returns a list of
+    (table, month, rows, path).
+    """
+    cutoff = month_of(now or datetime.utcnow())
+    for _ in range(keep_months):
+        cutoff = month_of(cutoff - timedelta(days=1))
+    watermark = platform_metrics_watermark()
+
+    archived = []
+    for partitions in (activity_partitions, search_partitions):
+        for month in partitions.months():
+            if month >= cutoff or watermark is None or next_month(month) - timedelta(days=1) > watermark:
+                continue
+            rows, path = partitions.archive(month, directory)
+            db.session.commit()
+            archived.append((partitions.template.name, month, rows, path))
+    return archived
+
+# BusinessAnalytics columns loaded into a DailySeries
+SERIES_COLUMNS = DAILY_COUNTERS + (
+    'unique_visitors', 'search_appearances', 'reviews_received',
+    'average_rating', 'search_ranking_avg', 'category_ranking'
+)
+
+class DailySeries:
+    """A business's daily analytics over a date range as NumPy columns.
+
+    Loaded with one query of plain tuples, no ORM objects. `dates` holds
+    every day from `start` to `end`; `columns[name]` the value of each
+    day (0 on days without a row) and `present` marks the days that have
+    a row. NULLs count as 0 too; `nulls[name]` marks them for the integer
+    columns (float columns hold NaN). Totals, period comparisons and
+    moving averages are array operations over these.
+    """
+
+    def __init__(self, business_id, start, end, ids, columns, nulls):
+        self.business_id = business_id
+        self.start = start
+        self.end = end
+        self.dates = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        self.ids = ids
+        self.present = ids > 0
+        self.columns = columns
+        self.nulls = nulls
+
+    @classmethod
+    def load(cls, business_id, start, end=None):
+        end = end or datetime.utcnow().date()
+        table = BusinessAnalytics.__table__
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.date, *[table.c[name] for name in SERIES_COLUMNS])
+            .where(table.c.business_id == business_id, table.c.date >= start, table.c.date <= end)
+        ).all()
+
+        size = max((end - start).days + 1, 0)
+        offsets = np.fromiter(((row[1] - start).days for row in rows), dtype=np.int64, count=len(rows))
+        ids = np.zeros(size, dtype=np.int64)
+        ids[offsets] = [row[0] for row in rows]
+        columns = {}
+        nulls = {}
+        for index, name in enumerate(SERIES_COLUMNS, start=2):
+            dtype = column_dtype(table.c[name])
+            stored = [row[index] for row in rows]
+            values = np.zeros(size, dtype=dtype)
+            values[offsets] = to_array(stored, dtype)
+            columns[name] = values
+            if dtype.kind == 'i':
+                nulls[name] = np.zeros(size, dtype=bool)
+                nulls[name][offsets] = [value is None for value in stored]
+        return cls(business_id, start, end, ids, columns, nulls)
+
+    def _days(self, since=None, until=None):
+        """Slice of the days with since <= day < until"""
+        first = 0 if since is None else max((since - self.start).days, 0)
+        last = len(self.dates) if until is None else max((until - self.start).days, 0)
+        return slice(first, last)
+
+    def total(self, name, since=None, until=None):
+        return self.columns[name][self._days(since, until)].sum().item()
+
+    def totals(self, names, since=None, until=None):
+        return {name: self.total(name, since, until) for name in names}
+
+    def moving_average(self, name, window=7):
+        """Trailing `window`-day average of each day (fewer days at the start)"""
+        sums = np.cumsum(self.columns[name], dtype=np.float64)
+        sums[window:] = sums[window:] - sums[:-window]
+        return sums / np.minimum(np.arange(1, len(sums) + 1), window)
+
+    def rows(self):
+        """BusinessAnalytics.to_dict() of the days with a row, newest first"""
+        indexes = np.flatnonzero(self.present)[::-1]
+        ids = self.ids[indexes].tolist()
+        dates = self.dates[indexes].astype(str).tolist()
+        values = {}
+        for name in SERIES_COLUMNS:
+            column = self.columns[name][indexes]
+            # to_dict() reports NULLs as None
+            if name in self.nulls:
+                values[name] = np.where(self.nulls[name][indexes], None, column).tolist()
+            elif column.dtype.kind == 'f':
+                values[name] = np.where(np.isnan(column), None, column).tolist()
+            else:
+                values[name] = column.tolist()
+        return [
+            dict({name: values[name][position] for name in SERIES_COLUMNS},
+                 id=ids[position], business_id=self.business_id, date=dates[position])
+            for position in range(len(indexes))
+        ]
@@ -1,9 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm.attributes import set_committed_value
 from src.models.user import db
+from src.models.dimension import canonical_key, dimension_entries, adjust_dimensions
+from src.models.slug import BusinessSlugRedirect, assign_slugs
+from src.models import catalog  # registers the commit hooks that publish business changes
 
 class Business(db.Model):
     __tablename__ = 'businesses'
+    __table_args__ = (
+        db.Index('ix_businesses_city_category', 'city_key', 'category_key'),
+        db.Index('ix_businesses_state_city', 'state_key', 'city_key'),
+        db.Index('ix_businesses_category_minority_type', 'category_key', 'minority_type_key'),
+        db.Index('ix_businesses_minority_type', 'minority_type_key'),
+        db.Index('ix_businesses_external_id', 'external_id', unique=True),
+        db.Index('ix_businesses_slug', 'slug', unique=True),
+        db.Index('ix_businesses_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -25,6 +39,24 @@ class Business(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Review aggregates, maintained by the Review flush hooks so listings
+    # never have to load the reviews themselves
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Canonical filter keys (see canonical_key), set on every flush so
+    # filtering is an exact-match index seek
+    city_key = db.Column(db.String(100))
+    state_key = db.Column(db.String(50))
+    category_key = db.Column(db.String(100))
+    minority_type_key = db.Column(db.String(100))
+    
+    # Record id in an imported dataset (see import_businesses.py)
+    external_id = db.Column(db.String(64))
+    
+    # /biz/<slug> of the profile page, set on insert and rename (see assign_slugs)
+    slug = db.Column(db.String(300))
+    
     # Relationship with reviews
     reviews = db.relationship('Review', backref='business', lazy=True, cascade='all, delete-orphan')
 
@@ -33,13 +65,9 @@ class Business(db.Model):
 
     @property
     def average_rating(self):
-        if not self.reviews:
+        if not self.review_count:
             return 0
-        return sum(review.rating for review in self.reviews) / len(self.reviews)
-
-    @property
-    def review_count(self):
-        return len(self.reviews)
+        return self.rating_sum / self.review_count
 
     def to_dict(self):
         return {
@@ -60,6 +88,7 @@ class Business(db.Model):
             'longitude': self.longitude,
             'image_url': self.image_url,
             'hours': self.hours,
+            'slug': self.slug,
             'average_rating': round(self.average_rating, 1),
             'review_count': self.review_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -71,3 +100,67 @@ class Business(db.Model):
         data['reviews'] = [review.to_dict() for review in self.reviews]
         return data
 
+_DIMENSION_FIELDS = ('city', 'state', 'category', 'minority_type')
+
+@event.listens_for(Business, 'before_insert')
+@event.listens_for(Business, 'before_update')
+def _set_dimension_keys(mapper, connection, business):
+    for field in _DIMENSION_FIELDS:
+        setattr(business, f'{field}_key', canonical_key(getattr(business, field)))
+
+def _refresh_slug(connection, business):
+    assigned = assign_slugs(connection, [business.id])
+    if business.id in assigned:
+        set_committed_value(business, 'slug', assigned[business.id])
+
+@event.listens_for(Business, 'after_insert')
+def _business_inserted(mapper, connection, business):
+    adjust_dimensions(connection, dimension_entries(*(getattr(business, f) for f in _DIMENSION_FIELDS)), 1)
+    _refresh_slug(connection, business)
+
+@event.listens_for(Business, 'after_delete')
+def _business_deleted(mapper, connection, business):
+    adjust_dimensions(connection, dimension_entries(*(getattr(business, f) for f in _DIMENSION_FIELDS)), -1)
+    connection.execute(BusinessSlugRedirect.__table__.delete().where(
+        BusinessSlugRedirect.business_id == business.id
+    ))
+
+@event.listens_for(Business, 'after_update')
+def _business_updated(mapper, connection, business):
+    state = inspect(business)
+    old_values = []
+    for field in _DIMENSION_FIELDS:
+        history = state.attrs[field].history
+        old_values.append(history.deleted[0] if history.deleted else getattr(business, field))
+
+    old_entries = set(dimension_entries(*old_values))
+    new_entries = set(dimension_entries(*(getattr(business, f) for f in _DIMENSION_FIELDS)))
+    if old_entries != new_entries:
+        adjust_dimensions(connection, old_entries - new_entries, -1)
+        adjust_dimensions(connection, new_entries - old_entries, 1)
+    if state.attrs.name.history.has_changes() or state.attrs.city.history.has_changes():
+        _refresh_slug(connection, business)
+
+def refresh_rating_aggregates():
+    """Recompute review_count and rating_sum for every business from reviews.
+
+    A one-shot backfill/repair for the materialized aggregates; normal
+    review writes keep them up to date incrementally.
+    """
+    from .review import Review
+
+    businesses = Business.__table__
+    reviews = Review.__table__
+    count = db.select(db.func.count()).where(reviews.c.business_id == businesses.c.id).scalar_subquery()
+    total = db.select(db.func.coalesce(db.func.sum(reviews.c.rating), 0)).where(
+        reviews.c.business_id == businesses.c.id
+    ).scalar_subquery()
+
+    result = db.session.execute(db.update(businesses).values(
+        review_count=count,
+        rating_sum=total,
+        updated_at=businesses.c.updated_at  # not a business edit
+    ))
+    catalog.mark_bulk_change()
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,192 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from .user import db
+from .business import Business, _DIMENSION_FIELDS
+from .review import Review
+from .catalog import notify_catalog_change
+from .dimension import canonical_key, dimension_entries, adjust_dimensions
+from .slug import BusinessSlugRedirect, assign_slugs
+
+MAX_BATCH_OPERATIONS = 1000
+REQUIRED_FIELDS = ('name', 'address', 'city', 'state', 'category', 'minority_type')
+WRITABLE_FIELDS = REQUIRED_FIELDS + (
+    'description', 'zip_code', 'phone', 'website', 'google_place_id',
+    'latitude', 'longitude', 'image_url', 'hours'
+)
+
+class BatchError(ValueError):
+    """A batch that can't be run at all (as opposed to a failed operation)"""
+
+def _check_fields(data, creating):
+    if not isinstance(data, dict):
+        return 'data must be an object'
+    unknown = sorted(set(data) - set(WRITABLE_FIELDS))
+    if unknown:
+        return f'Unknown fields: {", ".join(unknown)}'
+    not_text = [
+        field for field, value in data.items()
+        if field not in ('latitude', 'longitude') and value is not None and not isinstance(value, str)
+    ]
+    if not_text:
+        return f'Must be strings: {", ".join(sorted(not_text))}'
+    missing = [field for field in REQUIRED_FIELDS if (creating or field in data) and not data.get(field)]
+    if missing:
+        return f'Missing fields: {", ".join(missing)}'
+    for field in ('latitude', 'longitude'):
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f'{field} must be a number'
+    return None
+
+def _with_keys(values):
+    for field in _DIMENSION_FIELDS:
+        if field in values:
+            values[f'{field}_key'] = canonical_key(values[field])
+    return values
+
+def apply_business_batch(operations, atomic=False):
+    """Run create/update/delete operations on businesses in one transaction.
+
+    Each operation is {"op": "create", "data": {...}}, {"op": "update",
+    "id": ..., "data": {...}} or {"op": "delete", "id": ...}. Operations are
+    validated up front, then written with one statement per kind (updates
+    touching the same fields share an executemany), not one round trip per
+    business. Returns a result per operation, in order, with a "status"
+    (201/200/204 on success, 400/404/409 for a rejected operation). With
+    `atomic`, nothing is written if any operation is rejected.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BatchError('operations must be a non-empty list')
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise BatchError(f'At most {MAX_BATCH_OPERATIONS} operations per batch')
+
+    businesses = Business.__table__
+    results = [None] * len(operations)
+    creates, updates, deletes = [], {}, {}
+
+    referenced = {
+        op.get('id') for op in operations
+        if isinstance(op, dict) and op.get('op') in ('update', 'delete') and isinstance(op.get('id'), int)
+    }
+    existing = {
+        row.id: row for row in db.session.execute(
+            db.select(businesses.c.id, *(businesses.c[f] for f in _DIMENSION_FIELDS))
+            .where(businesses.c.id.in_(referenced))
+        )
+    }
+
+    seen_ids = set()
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        result = {'index': index, 'op': kind}
+        results[index] = result
+        if kind not in ('create', 'update', 'delete'):
+            result.update(status=400, error='op must be create, update or delete')
+            continue
+
+        if kind == 'create':
+            error = _check_fields(op.get('data'), creating=True)
+            if error:
+                result.update(status=400, error=error)
+            else:
+                creates.append((index, op['data']))
+            continue
+
+        business_id = op.get('id')
+        result['id'] = business_id
+        if not isinstance(business_id, int) or business_id not in existing:
+            result.update(status=404, error='Business not found')
+            continue
+        if business_id in seen_ids:
+            result.update(status=409, error='Business already changed earlier in this batch')
+            continue
+        seen_ids.add(business_id)
+
+        if kind == 'delete':
+            deletes[business_id] = index
+            continue
+        error = _check_fields(op.get('data'), creating=False)
+        if error or not op['data']:
+            result.update(status=400, error=error or 'Nothing to update')
+            continue
+        updates[business_id] = (index, op['data'])
+
+    if atomic and any('error' in result for result in results):
+        for result in results:
+            if 'error' not in result:
+                result.update(status=424, error='Not applied: another operation in the batch was rejected')
+        return results
+
+    now = datetime.utcnow()
+    dimension_deltas = Counter()
+    try:
+        if creates:
+            rows = [_with_keys(dict(data)) for _, data in creates]
+            created = db.session.execute(
+                businesses.insert().returning(businesses.c.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            for (index, data), business_id in zip(creates, created):
+                results[index].update(status=201, id=business_id)
+                dimension_deltas.update(dimension_entries(*(data.get(f) for f in _DIMENSION_FIELDS)))
+
+        # executemany needs the same parameters in every row: group by field set
+        groups = defaultdict(list)
+        for business_id, (index, data) in updates.items():
+            groups[tuple(sorted(data))].append(business_id)
+            old = existing[business_id]
+            new_values = {f: data.get(f, getattr(old, f)) for f in _DIMENSION_FIELDS}
+            old_entries = set(dimension_entries(*(getattr(old, f) for f in _DIMENSION_FIELDS)))
+            new_entries = set(dimension_entries(*(new_values[f] for f in _DIMENSION_FIELDS)))
+            dimension_deltas.subtract(old_entries - new_entries)
+            dimension_deltas.update(new_entries - old_entries)
+            results[index]['status'] = 200
+        for fields, business_ids in groups.items():
+            columns = fields + tuple(f'{f}_key' for f in _DIMENSION_FIELDS if f in fields)
+            db.session.execute(
+                businesses.update()
+                .where(businesses.c.id == db.bindparam('b_id'))
+                .values(dict({column: db.bindparam(f'b_{column}') for column in columns}, updated_at=now)),
+                [
+                    dict({f'b_{k}': v for k, v in _with_keys(dict(updates[business_id][1])).items()}, b_id=business_id)
+                    for business_id in business_ids
+                ]
+            )
+
+        if deletes:
+            deleted_ids = list(deletes)
+            # The ORM cascade doesn't apply to Core deletes
+            db.session.execute(Review.__table__.delete().where(Review.__table__.c.business_id.in_(deleted_ids)))
+            db.session.execute(BusinessSlugRedirect.__table__.delete().where(
+                BusinessSlugRedirect.business_id.in_(deleted_ids)
+            ))
+            db.session.execute(businesses.delete().where(businesses.c.id.in_(deleted_ids)))
+            for business_id, index in deletes.items():
+                old = existing[business_id]
+                dimension_deltas.subtract(dimension_entries(*(getattr(old, f) for f in _DIMENSION_FIELDS)))
+                results[index]['status'] = 204
+
+        by_delta = defaultdict(list)
+        for entry, delta in dimension_deltas.items():
+            if delta:
+                by_delta[delta].append(entry)
+        connection = db.session.connection()
+        for delta, entries in by_delta.items():
+            adjust_dimensions(connection, entries, delta)
+        renamed = [business_id for business_id, (index, data) in updates.items() if 'name' in data or 'city' in data]
+        assign_slugs(connection, [results[index]['id'] for index, _ in creates] + renamed)
+
+        db.session.commit()
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        raise BatchError(f'Batch failed and was rolled back: {getattr(error, "orig", error)}')
+
+    # Core writes skip the commit hooks; publish the changes ourselves
+    changed_ids = [result['id'] for result in results if result.get('status') in (200, 201)]
+    upserted = []
+    if changed_ids:
+        upserted = [row._asdict() for row in db.session.execute(
+            db.select(businesses).where(businesses.c.id.in_(changed_ids))
+        )]
+    notify_catalog_change(upserted, list(deletes))
+    return results
@@ -0,0 +1,285 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from .user import db
+
+class CatalogVersion(db.Model):
+    """Version counter bumped by triggers on every catalog write.
+
+    Read endpoints derive their ETag / Last-Modified from it, so a client
+    revalidation can be answered without running the query.
+    """
+    __tablename__ = 'catalog_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class CatalogChange(db.Model):
+    """A business written by any process, appended by triggers.
+
+    Lets every process replay the writes of the others to its in-memory
+    indexes (see CatalogChangeFeed). Only the last CHANGE_LOG_SIZE entries
+    are kept.
+    """
+    __tablename__ = 'catalog_changes'
+    __table_args__ = {'sqlite_autoincrement': True}  # never reuse a pruned seq
+
+    seq = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, nullable=False)
+
+CHANGE_LOG_SIZE = 10000
+
+# Tables whose writes change what the business and review reads return
+# (review payloads embed the author's username)
+_VERSIONED_TABLES = {
+    'businesses': ('INSERT', 'UPDATE', 'DELETE'),
+    'reviews': ('INSERT', 'UPDATE', 'DELETE'),
+    'users': ('UPDATE', 'DELETE'),
+}
+
+# (operation, changed columns, rows whose business is logged)
+_SUBSCRIPTION_TRIGGERS = (
+    ('INSERT', '', ('new',)),
+    ('UPDATE', ' OF business_id, subscription_type, status, current_period_end, trial_end', ('old', 'new')),
+    ('DELETE', '', ('old',)),
+)
+
+def init_catalog_version():
+    """Create the catalog version row and the triggers that bump it"""
+    db.session.execute(text(
+        "INSERT OR IGNORE INTO catalog_versions (name, version, changed_at) "
+        "VALUES ('catalog', 0, CURRENT_TIMESTAMP)"
+    ))
+    for table, operations in _VERSIONED_TABLES.items():
+        for operation in operations:
+            db.session.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS catalog_version_{table}_{operation.lower()}
+                AFTER {operation} ON {table} BEGIN
+                    UPDATE catalog_versions
+                    SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+                    WHERE name = 'catalog';
+                END
+            """))
+    for operation, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+        db.session.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS catalog_changes_businesses_{operation.lower()}
+            AFTER {operation} ON businesses BEGIN
+                INSERT INTO catalog_changes (business_id) VALUES ({row}.id);
+                DELETE FROM catalog_changes WHERE seq <= last_insert_rowid() - {CHANGE_LOG_SIZE};
+            END
+        """))
+    # A business's subscription decides its premium placement in the
+    # relevance ranking: bump the version and log the business as changed
+    for operation, columns, rows in _SUBSCRIPTION_TRIGGERS:
+        logged = ''.join(
+            f"INSERT INTO catalog_changes (business_id) "
+            f"SELECT {row}.business_id WHERE {row}.business_id IS NOT NULL;\n"
+            for row in rows
+        )
+        db.session.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS catalog_changes_subscriptions_{operation.lower()}
+            AFTER {operation}{columns} ON subscriptions
+            WHEN {' OR '.join(f'{row}.business_id IS NOT NULL' for row in rows)} BEGIN
+                UPDATE catalog_versions
+                SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+                WHERE name = 'catalog';
+                {logged}
+                DELETE FROM catalog_changes WHERE seq <= last_insert_rowid() - {CHANGE_LOG_SIZE};
+            END
+        """))
+    db.session.commit()
+
+def current_catalog_version():
+    """(version, changed_at) of the catalog, a single primary key lookup"""
+    row = db.session.execute(text(
+        "SELECT version, changed_at FROM catalog_versions WHERE name = 'catalog'"
+    )).first()
+    if row is None:
+        return 0, None
+    changed_at = row.changed_at
+    if isinstance(changed_at, str):
+        changed_at = datetime.fromisoformat(changed_at)
+    return row.version, changed_at
+
+def mark_bulk_change():
+    """Record a bulk rewrite of businesses (imports, repairs) in the session.
+
+    Replaying a bulk rewrite change by change would cost more than a
+    reload; this tells every process's in-memory indexes to reload instead
+    (see CatalogChangeFeed).
+    """
+    db.session.execute(text(
+        "INSERT OR IGNORE INTO catalog_versions (name, version, changed_at) "
+        "VALUES ('bulk', 0, CURRENT_TIMESTAMP)"
+    ))
+    db.session.execute(text(
+        "UPDATE catalog_versions SET version = version + 1, changed_at = CURRENT_TIMESTAMP "
+        "WHERE name = 'bulk'"
+    ))
+
+# How often each process checks the catalog for other processes' writes
+FEED_CHECK_SECONDS = 0.5
+
+class CatalogChangeFeed:
+    """Brings the in-memory indexes of this process up to date with other processes.
+
+    Commit hooks only see writes made in their own process. sync() reads
+    the trigger-maintained catalog versions (a primary key lookup); when
+    the 'catalog' version moved, the businesses written since the last
+    sync are read back from catalog_changes and passed to the
+    on_catalog_change listeners like local commits (changes this process
+    made itself come around again, which the listeners take as a no-op).
+    After a mark_bulk_change(), or when this process fell further behind
+    than the change log reaches, `generation` moves on instead and the
+    indexes reload (see CatalogChangeWatcher). The versions are read at
+    most every `check_seconds`; lookups in between are served from memory.
+    """
+
+    def __init__(self, check_seconds=FEED_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._versions = None  # ('catalog' version, 'bulk' version) at the last sync
+        self._position = 0  # last catalog_changes seq seen
+        self.generation = 0
+
+    def sync(self, force=False):
+        if not force and self._checked_at is not None and time.monotonic() - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            with db.engine.connect() as connection:
+                versions = dict(connection.execute(text(
+                    "SELECT name, version FROM catalog_versions WHERE name IN ('catalog', 'bulk')"
+                )).all())
+                versions = (versions.get('catalog', 0), versions.get('bulk', 0))
+                if versions == self._versions:
+                    return
+                first, last = connection.execute(text("SELECT min(seq), max(seq) FROM catalog_changes")).one()
+                replay = (self._versions is not None and versions[1] == self._versions[1]
+                          and (first is None or first <= self._position + 1))
+                changed_ids = set()
+                if replay and last is not None and last > self._position:
+                    changed_ids.update(connection.execute(
+                        text("SELECT DISTINCT business_id FROM catalog_changes WHERE seq > :seq"),
+                        {'seq': self._position}
+                    ).scalars())
+                upserted = []
+                if changed_ids:
+                    from .business import Business
+
+                    businesses = Business.__table__
+                    upserted = [row._asdict() for row in connection.execute(
+                        db.select(businesses).where(businesses.c.id.in_(changed_ids))
+                    )]
+            if self._versions is not None and not replay:
+                self.generation += 1
+            self._versions = versions
+            self._position = last or 0
+            if changed_ids:
+                notify_catalog_change(upserted, changed_ids - {business['id'] for business in upserted})
+
+catalog_feed = CatalogChangeFeed()
+
+class CatalogChangeWatcher:
+    """Tells an in-memory index whether it must reload, after syncing catalog_feed.
+
+    Incremental changes reach the index through its on_catalog_change
+    listener; stale() is only true when the feed can't replay them.
+    """
+
+    def __init__(self):
+        self._generation = None
+
+    def mark_loaded(self):
+        """Call before (re)loading the index from the database"""
+        catalog_feed.sync(force=True)
+        self._generation = catalog_feed.generation
+
+    def stale(self):
+        if self._generation is None:
+            return False
+        catalog_feed.sync()
+        return catalog_feed.generation != self._generation
+
+# Listeners notified after a transaction that changed businesses commits.
+# In-memory indexes use this to apply changes incrementally instead of
+# reloading the catalog.
+_listeners = []
+
+def on_catalog_change(listener):
+    """Register `listener(upserted, deleted_ids)` for committed business changes.
+
+    `upserted` is a list of column-value dicts (see business_snapshot) for
+    created or updated businesses, `deleted_ids` a list of business ids.
+    Can be used as a decorator.
+    """
+    _listeners.append(listener)
+    return listener
+
+def notify_catalog_change(upserted=(), deleted_ids=()):
+    """Notify listeners of committed changes.
+
+    Called automatically for ORM writes; code that changes businesses with
+    Core statements must call it after committing.
+    """
+    upserted = list(upserted)
+    deleted_ids = list(deleted_ids)
+    if not upserted and not deleted_ids:
+        return
+    for listener in _listeners:
+        listener(upserted, deleted_ids)
+
+_rating_listeners = []
+
+def on_rating_change(listener):
+    """Register `listener(business_ids)` for businesses whose reviews changed.
+
+    Review writes adjust the rating aggregates with Core updates, so they
+    aren't part of the business snapshots passed to on_catalog_change
+    listeners. Can be used as a decorator.
+    """
+    _rating_listeners.append(listener)
+    return listener
+
+def business_snapshot(business):
+    """Column values of a Business as a plain dict, safe to use after commit"""
+    return {attr.key: getattr(business, attr.key) for attr in inspect(business).mapper.column_attrs}
+
+def _pending(session):
+    return session.info.setdefault('catalog_changes', ({}, set(), set()))
+
+@event.listens_for(Session, 'after_flush')
+def _collect_business_changes(session, flush_context):
+    from .business import Business
+    from .review import Review
+
+    upserted, deleted, rated = _pending(session)
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Business):
+            upserted[obj.id] = business_snapshot(obj)
+            deleted.discard(obj.id)
+        elif isinstance(obj, Review):
+            rated.add(obj.business_id)
+    for obj in session.deleted:
+        if isinstance(obj, Business):
+            upserted.pop(obj.id, None)
+            deleted.add(obj.id)
+        elif isinstance(obj, Review):
+            rated.add(obj.business_id)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_business_changes(session):
+    upserted, deleted, rated = session.info.pop('catalog_changes', ({}, set(), set()))
+    notify_catalog_change(upserted.values(), deleted)
+    rated -= deleted
+    if rated:
+        for listener in _rating_listeners:
+            listener(list(rated))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_business_changes(session):
+    session.info.pop('catalog_changes', None)
@@ -0,0 +1,114 @@
+import re
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .user import db
+from .catalog import mark_bulk_change
+
+def canonical_key(value):
+    """Canonical form of a filter value: trimmed, lowercased, single-spaced"""
+    if value is None:
+        return None
+    return re.sub(r'\s+', ' ', value).strip().lower() or None
+
+class BusinessDimension(db.Model):
+    """Distinct filter values (categories, cities, ...) with business counts.
+
+    A small lookup table maintained alongside `businesses` so listing the
+    available filter values doesn't need a DISTINCT scan of the catalog.
+    """
+    __tablename__ = 'business_dimensions'
+    __table_args__ = (
+        db.UniqueConstraint('dimension', 'key', name='uq_business_dimensions_dimension_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)  # 'category', 'minority_type', 'state', 'city'
+    key = db.Column(db.String(200), nullable=False)  # canonical key; "state|city" for cities
+    label = db.Column(db.String(200), nullable=False)  # display value, e.g. "Buffalo, NY"
+    business_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<BusinessDimension {self.dimension}:{self.key}>'
+
+    def to_dict(self):
+        return {
+            'dimension': self.dimension,
+            'key': self.key,
+            'label': self.label,
+            'business_count': self.business_count
+        }
+
+def dimension_entries(city, state, category, minority_type):
+    """The (dimension, key, label) entries a business with these values counts towards"""
+    entries = []
+    if canonical_key(category):
+        entries.append(('category', canonical_key(category), category.strip()))
+    if canonical_key(minority_type):
+        entries.append(('minority_type', canonical_key(minority_type), minority_type.strip()))
+    if canonical_key(state):
+        entries.append(('state', canonical_key(state), state.strip()))
+        if canonical_key(city):
+            entries.append((
+                'city',
+                f'{canonical_key(state)}|{canonical_key(city)}',
+                f'{city.strip()}, {state.strip()}'
+            ))
+    return entries
+
+def adjust_dimensions(connection, entries, delta):
+    """Add `delta` to the business count of each entry, creating rows as needed"""
+    dimensions = BusinessDimension.__table__
+    for dimension, key, label in entries:
+        connection.execute(
+            sqlite_insert(dimensions)
+            .values(dimension=dimension, key=key, label=label, business_count=delta)
+            .on_conflict_do_update(
+                index_elements=['dimension', 'key'],
+                set_={'business_count': dimensions.c.business_count + delta}
+            )
+        )
+
+def refresh_dimensions():
+    """Recompute the canonical keys on businesses and rebuild the dimension table"""
+    from .business import Business
+
+    businesses = Business.__table__
+    rows = db.session.execute(db.select(
+        businesses.c.id, businesses.c.city, businesses.c.state,
+        businesses.c.category, businesses.c.minority_type
+    )).all()
+
+    if rows:
+        db.session.execute(
+            businesses.update()
+            .where(businesses.c.id == db.bindparam('b_id'))
+            .values(
+                city_key=db.bindparam('b_city_key'),
+                state_key=db.bindparam('b_state_key'),
+                category_key=db.bindparam('b_category_key'),
+                minority_type_key=db.bindparam('b_minority_type_key'),
+                updated_at=businesses.c.updated_at  # not a business edit
+            ),
+            [{
+                'b_id': row.id,
+                'b_city_key': canonical_key(row.city),
+                'b_state_key': canonical_key(row.state),
+                'b_category_key': canonical_key(row.category),
+                'b_minority_type_key': canonical_key(row.minority_type)
+            } for row in rows]
+        )
+
+    counts = {}
+    for row in rows:
+        for dimension, key, label in dimension_entries(row.city, row.state, row.category, row.minority_type):
+            entry = counts.setdefault((dimension, key), [label, 0])
+            entry[1] += 1
+
+    db.session.execute(BusinessDimension.__table__.delete())
+    if counts:
+        db.session.execute(BusinessDimension.__table__.insert(), [
+            {'dimension': dimension, 'key': key, 'label': label, 'business_count': count}
+            for (dimension, key), (label, count) in counts.items()
+        ])
+    mark_bulk_change()
+    db.session.commit()
+    return len(counts)
@@ -0,0 +1,115 @@
+import math
+from sqlalchemy import text, table, column
+from .user import db
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# R*Tree over business coordinates. Each business with a location is stored
+# as a degenerate box (min == max) keyed by the business id; the triggers
+# below keep it in sync with `businesses.latitude` / `businesses.longitude`.
+business_geo = table(
+    'businesses_geo',
+    column('id'), column('min_lat'), column('max_lat'), column('min_lng'), column('max_lng')
+)
+
+_GEO_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS businesses_geo USING rtree(
+        id, min_lat, max_lat, min_lng, max_lng
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS businesses_geo_ai AFTER INSERT ON businesses
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO businesses_geo VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS businesses_geo_ad AFTER DELETE ON businesses BEGIN
+        DELETE FROM businesses_geo WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS businesses_geo_au AFTER UPDATE OF latitude, longitude ON businesses BEGIN
+        DELETE FROM businesses_geo WHERE id = old.id;
+        INSERT INTO businesses_geo
+        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END
+    """,
+]
+
+def init_geo_index(rebuild=False):
+    """Create the spatial index and its sync triggers if they don't exist.
+
+    Like the search index, it is refilled from `businesses` when first
+    created or when `rebuild` is set.
+    """
+    exists = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'businesses_geo'"
+    )).first() is not None
+
+    for statement in _GEO_INDEX_DDL:
+        db.session.execute(text(statement))
+
+    if rebuild or not exists:
+        db.session.execute(text("DELETE FROM businesses_geo"))
+        db.session.execute(text("""
+            INSERT INTO businesses_geo
+            SELECT id, latitude, latitude, longitude, longitude FROM businesses
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """))
+
+    db.session.commit()
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def radius_bounds(lat, lng, radius_km):
+    """Bounding box (min_lat, max_lat, min_lng, max_lng) enclosing a circle"""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlng = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (
+        max(lat - dlat, -90.0), min(lat + dlat, 90.0),
+        max(lng - dlng, -180.0), min(lng + dlng, 180.0)
+    )
+
+def squared_distance_expr(lat, lng):
+    """SQL expression for the squared equirectangular distance in km².
+
+    Accurate to well under a percent at city scale, which is all ordering
+    and radius filtering need; exact distances are computed with
+    haversine_km() for the returned page only.
+    """
+    from .business import Business
+
+    lng_scale = KM_PER_DEGREE * math.cos(math.radians(lat))
+    dy = (Business.latitude - lat) * KM_PER_DEGREE
+    dx = (Business.longitude - lng) * lng_scale
+    return dy * dy + dx * dx
+
+def apply_bounds(query, min_lat, max_lat, min_lng, max_lng):
+    """Restrict a Business query to a lat/lng box using the R*Tree"""
+    from .business import Business
+
+    return query.join(
+        business_geo, business_geo.c.id == Business.id
+    ).filter(
+        business_geo.c.min_lat >= min_lat,
+        business_geo.c.max_lat <= max_lat,
+        business_geo.c.min_lng >= min_lng,
+        business_geo.c.max_lng <= max_lng
+    )
+
+def apply_radius(query, lat, lng, radius_km):
+    """Restrict a Business query to a circle, nearest first"""
+    distance = squared_distance_expr(lat, lng)
+    query = apply_bounds(query, *radius_bounds(lat, lng, radius_km))
+    return query.filter(distance <= radius_km * radius_km).order_by(distance)
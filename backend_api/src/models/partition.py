@@ -0,0 +1,234 @@
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime
+from sqlalchemy import text
+from .user import db
+
+def month_of(moment):
+    """First day of the month of a date or datetime"""
+    return date(moment.year, moment.month, 1)
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _as_datetime(moment):
+    if isinstance(moment, datetime):
+        return moment
+    return datetime.combine(moment, datetime.min.time())
+
+class PartitionSequence(db.Model):
+    """The last id handed out to rows of a partitioned table, across all its partitions"""
+    __tablename__ = 'partition_sequences'
+
+    name = db.Column(db.String(100), primary_key=True)  # the template table
+    last_id = db.Column(db.Integer, nullable=False)
+
+class MonthlyPartitions:
+    """Stores an append-only event table as one table per calendar month.
+
+    The model's table is the template: partitions are named
+    <table>_YYYY_MM and get its columns and indexes (without foreign keys),
+    created on first write. Reads name a time range and only touch the
+    partitions that overlap it, and a month that is no longer needed is
+    archived and dropped whole instead of deleted row by row. Ids come
+    from one sequence per table (see reserve_ids), so they stay unique
+    across months.
+    """
+
+    def __init__(self, model, time_column):
+        self.template = model.__table__
+        self.time_column = time_column
+        self._metadata = db.MetaData()
+        self._tables = {}
+        self._pattern = re.compile(rf'^{re.escape(self.template.name)}_(\d{{4}})_(\d{{2}})$')
+
+    def name(self, month):
+        return f'{self.template.name}_{month:%Y_%m}'
+
+    def table(self, month):
+        """The Table of a month's partition (whether or not it exists yet)"""
+        table = self._tables.get(month)
+        if table is None:
+            name = self.name(month)
+            table = db.Table(name, self._metadata, *[
+                db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                for column in self.template.columns
+            ])
+            for index in self.template.indexes:
+                db.Index(index.name.replace(self.template.name, name, 1),
+                         *[table.c[column.name] for column in index.columns], unique=index.unique)
+            self._tables[month] = table
+        return table
+
+    def months(self):
+        """The months that have a partition, oldest first"""
+        names = db.session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix"),
+            {'prefix': f'{self.template.name}_%'}
+        ).scalars()
+        months = []
+        for name in names:
+            match = self._pattern.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    def between(self, start, end=None):
+        """(month, table) of the existing partitions overlapping [start, end)"""
+        first = month_of(start)
+        return [(month, self.table(month)) for month in self.months()
+                if month >= first and (end is None or month < _as_datetime(end).date())]
+
+    def _max_id(self):
+        tables = [self.template] + [self.table(month) for month in self.months()]
+        return max(db.session.execute(db.select(db.func.max(table.c.id))).scalar() or 0 for table in tables)
+
+    def reserve_ids(self, count):
+        """The first of `count` consecutive ids no partition has used.
+
+        The sequence starts above the largest id stored when it is first
+        used; the UPDATE takes the write lock, so concurrent writers get
+        disjoint ranges.
+        """
+        sequences = PartitionSequence.__table__
+        name = self.template.name
+        reserve = (sequences.update().where(sequences.c.name == name)
+                   .values(last_id=sequences.c.last_id + count).returning(sequences.c.last_id))
+        last_id = db.session.execute(reserve).scalar()
+        if last_id is None:
+            db.session.execute(sequences.insert().prefix_with('OR IGNORE').values(name=name, last_id=self._max_id()))
+            last_id = db.session.execute(reserve).scalar()
+        return last_id - count + 1
+
+    def insert(self, rows):
+        """Insert row dicts into the partitions of their months, creating them as needed"""
+        rows = list(rows)
+        if not rows:
+            return
+        first_id = self.reserve_ids(len(rows))
+        by_month = {}
+        for offset, row in enumerate(rows):
+            row = dict(row, id=first_id + offset)
+            by_month.setdefault(month_of(row[self.time_column] or datetime.utcnow()), []).append(row)
+        connection = db.session.connection()
+        for month, month_rows in by_month.items():
+            table = self.table(month)
+            table.create(bind=connection, checkfirst=True)
+            connection.execute(table.insert(), month_rows)
+
+    def union(self, start, end=None, where=None):
+        """The rows with start <= time < end, as a subquery over the partitions in range.
+
+        `where(table)` returns extra criteria; they are applied inside each
+        partition so its indexes serve the whole filter.
+        """
+        start = _as_datetime(start)
+        selects = []
+        for month, table in self.between(start, end):
+            column = table.c[self.time_column]
+            criteria = [column >= start]
+            if end is not None:
+                criteria.append(column < _as_datetime(end))
+            if where is not None:
+                criteria.extend(where(table))
+            selects.append(db.select(table).where(*criteria))
+        if not selects:
+            selects.append(db.select(self.template).where(db.false()))
+        statement = selects[0] if len(selects) == 1 else db.union_all(*selects)
+        return statement.subquery(f'{self.template.name}_in_range')
+
+    def first_time(self):
+        """The earliest event time still stored, None if there is none"""
+        months = self.months()
+        if not months:
+            return None
+        table = self.table(months[0])
+        return db.session.execute(db.select(db.func.min(table.c[self.time_column]))).scalar()
+
+    def adopt(self):
+        """Move rows stored in the template table into their monthly partitions.
+
+        Rows without a time stay where they are. Returns the number moved.
+        """
+        time_column = self.template.c[self.time_column]
+        months = db.session.execute(
+            db.select(db.func.strftime('%Y-%m', time_column)).where(time_column.is_not(None)).distinct()
+        ).scalars().all()
+        connection = db.session.connection()
+        columns = [column.name for column in self.template.columns]
+        moved = 0
+        for value in months:
+            month = date(int(value[:4]), int(value[5:7]), 1)
+            in_month = db.and_(time_column >= _as_datetime(month), time_column < _as_datetime(next_month(month)))
+            table = self.table(month)
+            table.create(bind=connection, checkfirst=True)
+            connection.execute(table.insert().from_select(columns, db.select(self.template).where(in_month)))
+            moved += connection.execute(self.template.delete().where(in_month)).rowcount
+        return moved
+
+    def archive(self, month, directory):
+        """Write a month's partition to <directory>/<table>/YYYY-MM.jsonl.gz and drop it.
+
+        The file is written completely before the table is dropped (in the
+        session's transaction, which the caller commits). Returns
+        (rows, path).
+        """
+        table = self.table(month)
+        folder = os.path.join(directory, self.template.name)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'{month:%Y-%m}.jsonl.gz')
+
+        rows = 0
+        with gzip.open(f'{path}.tmp', 'wt', encoding='utf-8') as target:
+            for row in db.session.execute(db.select(table).order_by(table.c[self.time_column])).mappings():
+                target.write(json.dumps(
+                    {key: value.isoformat() if isinstance(value, (date, datetime)) else value
+                     for key, value in row.items()},
+                    separators=(',', ':')
+                ))
+                target.write('\n')
+                rows += 1
+        stored = db.session.execute(db.select(db.func.count()).select_from(table)).scalar()
+        if stored != rows:
+            os.remove(f'{path}.tmp')
+            raise RuntimeError(f'{table.name} changed while it was archived')
+        os.replace(f'{path}.tmp', path)
+        table.drop(bind=db.session.connection())
+        return rows, path
+
+def incremental_vacuum_enabled():
+    return db.session.execute(text('PRAGMA auto_vacuum')).scalar() == 2
+
+def enable_incremental_vacuum():
+    """Switch the database to auto_vacuum=INCREMENTAL.
+
+    Needs one full VACUUM (a rewrite of the file); afterwards free pages
+    can be released a few at a time with reclaim_space().
+    """
+    db.session.commit()
+    with db.engine.connect() as connection:
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        connection.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+        connection.execute(text('VACUUM'))
+    # Pooled connections keep reporting the old mode
+    db.engine.dispose()
+
+def reclaim_space(max_pages=None):
+    """Return up to `max_pages` free pages to the filesystem (all if None).
+
+    Returns the number of free pages left. Does nothing unless the database
+    uses auto_vacuum=INCREMENTAL.
+    """
+    free_pages = db.session.execute(text('PRAGMA freelist_count')).scalar()
+    if not free_pages or max_pages == 0 or not incremental_vacuum_enabled():
+        return free_pages
+    db.session.commit()
+    # The pragma frees one page per step, and the driver's execute() steps a
+    # statement without result columns only once; executescript() steps it
+    # to completion. (0 or no argument means every free page.)
+    pages = '' if max_pages is None else f'({min(free_pages, int(max_pages))})'
+    with db.engine.connect() as connection:
+        connection.connection.driver_connection.executescript(f'PRAGMA incremental_vacuum{pages}')
+    return db.session.execute(text('PRAGMA freelist_count')).scalar()
@@ -1,9 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event, inspect
 from src.models.user import db
 
 class Review(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('ix_reviews_business_id', 'business_id'),
+        db.Index('ix_reviews_user_id', 'user_id'),
+        db.Index('ix_reviews_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     business_id = db.Column(db.Integer, db.ForeignKey('businesses.id'), nullable=False)
@@ -36,3 +42,31 @@ class Review(db.Model):
             } if self.user else None
         }
 
+def _adjust_business_rating(connection, business_id, count_delta, rating_delta):
+    """Apply a review change to the business aggregates in the flush's transaction"""
+    from .business import Business
+
+    businesses = Business.__table__
+    connection.execute(
+        businesses.update()
+        .where(businesses.c.id == business_id)
+        .values(
+            review_count=businesses.c.review_count + count_delta,
+            rating_sum=businesses.c.rating_sum + rating_delta,
+            updated_at=businesses.c.updated_at  # not a business edit
+        )
+    )
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    _adjust_business_rating(connection, review.business_id, 1, review.rating)
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, review):
+    _adjust_business_rating(connection, review.business_id, -1, -review.rating)
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, review):
+    history = inspect(review).attrs.rating.history
+    if history.deleted and history.added:
+        _adjust_business_rating(connection, review.business_id, 0, history.added[0] - history.deleted[0])
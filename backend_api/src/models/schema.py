@@ -0,0 +1,120 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from .user import db
+
+class SchemaMigration(db.Model):
+    """A migration that has been applied to this database"""
+    __tablename__ = 'schema_migrations'
+
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# (version, name, apply) in the order they were written; see migration()
+MIGRATIONS = []
+
+def migration(version, name):
+    """Register `apply()` as schema migration `version`.
+
+    Versions only ever grow: a migration that has shipped is never edited,
+    later changes get a new version. A migration runs inside the session's
+    transaction and should tolerate objects that db.create_all() already
+    made on a fresh database.
+    """
+    def register(apply):
+        MIGRATIONS.append((version, name, apply))
+        return apply
+    return register
+
+def create_indexes(*names):
+    """Create the named model indexes on existing tables (CREATE INDEX IF NOT EXISTS)"""
+    indexes = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    connection = db.session.connection()
+    for name in names:
+        indexes[name].create(bind=connection, checkfirst=True)
+
+def schema_version():
+    """The newest migration applied to the database, 0 before any"""
+    return db.session.execute(db.select(db.func.max(SchemaMigration.version))).scalar() or 0
+
+def run_migrations():
+    """Apply the migrations that this database hasn't had yet, in version order.
+
+    Each migration is committed with its schema_migrations row, so an
+    interrupted run resumes where it stopped. Returns the applied versions.
+    """
+    SchemaMigration.__table__.create(bind=db.engine, checkfirst=True)
+    done = set(db.session.execute(db.select(SchemaMigration.version)).scalars())
+    applied = []
+    for version, name, apply in sorted(MIGRATIONS, key=lambda entry: entry[0]):
+        if version in done:
+            continue
+        try:
+            apply()
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def add_missing_columns():
+    """Add model columns that are missing from existing tables.
+
+    db.create_all() only creates tables that don't exist yet, so columns
+    added to a model later never reach a live database. Each missing column
+    is added with ALTER TABLE (it needs a server default if NOT NULL).
+    Returns the added columns as "table.column" strings.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+            added.append(f'{table.name}.{column.name}')
+
+    db.session.commit()
+    return added
+
+@migration(1, 'catalog, analytics and ranking indexes')
+def _catalog_indexes():
+    from .analytics import merge_duplicate_business_analytics
+
+    # The (business_id, date) index is unique; days written twice before it
+    # existed are merged first
+    merge_duplicate_business_analytics()
+    create_indexes(
+        'ix_businesses_city_category', 'ix_businesses_state_city',
+        'ix_businesses_category_minority_type', 'ix_businesses_minority_type',
+        'ix_businesses_external_id', 'ix_businesses_slug',
+        'ix_business_analytics_business_date', 'ix_platform_metrics_date',
+        'ix_user_activities_timestamp', 'ix_search_analytics_search_time'
+    )
+
+@migration(2, 'lookup indexes for analytics, reviews and billing')
+def _lookup_indexes():
+    create_indexes(
+        'ix_user_activities_business_timestamp', 'ix_user_activities_user_timestamp',
+        'ix_search_analytics_clicked_business_time',
+        'ix_reviews_business_id', 'ix_reviews_user_id', 'ix_reviews_created_at',
+        'ix_subscriptions_user_status', 'ix_subscriptions_status', 'ix_subscriptions_type_created',
+        'ix_payment_history_user_date', 'ix_payment_history_payment_date',
+        'ix_users_created_at', 'ix_businesses_created_at'
+    )
+
+@migration(3, 'monthly partitions for tracked events')
+def _partition_events():
+    from .analytics import activity_partitions, search_partitions
+
+    activity_partitions.adopt()
+    search_partitions.adopt()
@@ -0,0 +1,94 @@
+import re
+from sqlalchemy import text, table, column
+from .user import db
+
+# External-content FTS5 index over the searchable business columns. The
+# rows live in `businesses`; the index only stores the token data and is
+# kept in sync by the triggers below, inside the same transaction as the
+# write that touched the business.
+business_search = table('businesses_fts', column('rowid'), column('rank'))
+search_rank = business_search.c.rank
+
+# bm25() weights for name, description and category
+SEARCH_RANK_WEIGHTS = (10.0, 1.0, 4.0)
+
+_SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS businesses_fts USING fts5(
+        name, description, category,
+        content='businesses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS businesses_fts_ai AFTER INSERT ON businesses BEGIN
+        INSERT INTO businesses_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS businesses_fts_ad AFTER DELETE ON businesses BEGIN
+        INSERT INTO businesses_fts(businesses_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS businesses_fts_au AFTER UPDATE OF name, description, category ON businesses BEGIN
+        INSERT INTO businesses_fts(businesses_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO businesses_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END
+    """,
+]
+
+def init_search_index(rebuild=False):
+    """Create the full-text index and its sync triggers if they don't exist.
+
+    The index is rebuilt from `businesses` when it is first created or when
+    `rebuild` is set (e.g. after the businesses table was dropped and
+    recreated, which also drops the triggers).
+    """
+    exists = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'businesses_fts'"
+    )).first() is not None
+
+    for statement in _SEARCH_INDEX_DDL:
+        db.session.execute(text(statement))
+
+    # Persist the column weights so `ORDER BY rank` uses them
+    db.session.execute(text(
+        "INSERT INTO businesses_fts(businesses_fts, rank) VALUES ('rank', :rank)"
+    ), {'rank': 'bm25({})'.format(', '.join(str(w) for w in SEARCH_RANK_WEIGHTS))})
+
+    if rebuild or not exists:
+        db.session.execute(text("INSERT INTO businesses_fts(businesses_fts) VALUES ('rebuild')"))
+
+    db.session.commit()
+
+def build_match_query(search):
+    """Turn free text into an FTS5 MATCH expression.
+
+    Every token must match (implicit AND) and is treated as a prefix, so
+    "soul foo" finds "Soul Food Kitchen". Tokens are quoted, which keeps
+    FTS5 operators and punctuation in user input from being interpreted.
+    Returns None when the input has no searchable tokens.
+    """
+    tokens = re.findall(r'\w+', (search or '').lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def apply_search(query, match):
+    """Restrict a Business query to rows matching an FTS5 MATCH expression.
+
+    Order by `search_rank` (then id) to get the best matches first.
+    """
+    from .business import Business
+
+    return query.join(
+        business_search, business_search.c.rowid == Business.id
+    ).filter(
+        text('businesses_fts MATCH :match').bindparams(match=match)
+    )
@@ -0,0 +1,124 @@
+import re
+from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .user import db
+
+# SQLite's default limit on bound parameters per statement is 32766
+_IN_CHUNK = 10000
+
+def make_slug(name, city=''):
+    """URL slug of a business, the same as generate_sitemap.py and the frontend build"""
+    base = f"{name or ''} {city or ''}".lower()
+    base = re.sub(r'[^a-z0-9\s-]', '', base).strip()
+    base = re.sub(r'\s+', '-', base)
+    base = re.sub(r'-+', '-', base)
+    return base
+
+class BusinessSlugRedirect(db.Model):
+    """A slug a business had before it was renamed or moved.
+
+    Old /biz/<slug> URLs keep resolving (with a redirect); a slug is never
+    handed to a different business once it has been used.
+    """
+    __tablename__ = 'business_slug_redirects'
+
+    slug = db.Column(db.String(300), primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def _owners(connection, table, column, slugs):
+    owners = {}
+    slugs = list(slugs)
+    for start in range(0, len(slugs), _IN_CHUNK):
+        rows = connection.execute(
+            db.select(table.c.slug, column).where(table.c.slug.in_(slugs[start:start + _IN_CHUNK]))
+        )
+        owners.update((slug, owner) for slug, owner in rows)
+    return owners
+
+def assign_slugs(connection, business_ids=None):
+    """Give businesses the slug of their current name and city.
+
+    Only businesses without a slug, or whose name/city no longer matches
+    it, change. The slug is make_slug(name, city) unless another business
+    holds it (or held it), in which case the business id is appended, so
+    the outcome doesn't depend on processing order. A replaced slug is kept
+    as a redirect. `business_ids=None` means every business. Returns
+    {business id: new slug}.
+    """
+    from .business import Business
+
+    businesses = Business.__table__
+    redirects = BusinessSlugRedirect.__table__
+    query = db.select(businesses.c.id, businesses.c.name, businesses.c.city, businesses.c.slug)
+    if business_ids is not None:
+        business_ids = list(business_ids)
+        if not business_ids:
+            return {}
+        query = query.where(businesses.c.id.in_(business_ids))
+
+    pending = []
+    for row in connection.execute(query.order_by(businesses.c.id)):
+        base = make_slug(row.name, row.city) or 'business'
+        if row.slug not in (base, f'{base}-{row.id}'):
+            pending.append((row, base))
+    if not pending:
+        return {}
+
+    candidates = {base for _, base in pending} | {f'{base}-{row.id}' for row, base in pending}
+    taken = _owners(connection, redirects, redirects.c.business_id, candidates)
+    taken.update(_owners(connection, businesses, businesses.c.id, candidates))
+
+    assigned = {}
+    for row, base in pending:
+        slug, suffix = base, 1
+        while taken.get(slug, row.id) != row.id:
+            slug = f'{base}-{row.id}' if suffix == 1 else f'{base}-{row.id}-{suffix}'
+            suffix += 1
+            if slug not in candidates:
+                taken.update(_owners(connection, redirects, redirects.c.business_id, [slug]))
+                taken.update(_owners(connection, businesses, businesses.c.id, [slug]))
+        taken[slug] = row.id
+        assigned[row.id] = (row.slug, slug)
+
+    # Reclaimed slugs stop being redirects; replaced ones become redirects
+    connection.execute(
+        redirects.delete().where(redirects.c.slug == db.bindparam('b_slug')),
+        [{'b_slug': new} for old, new in assigned.values()]
+    )
+    connection.execute(
+        businesses.update()
+        .where(businesses.c.id == db.bindparam('b_id'))
+        .values(slug=db.bindparam('b_slug'), updated_at=businesses.c.updated_at),
+        [{'b_id': business_id, 'b_slug': new} for business_id, (old, new) in assigned.items()]
+    )
+    moved = [{'slug': old, 'business_id': business_id, 'created_at': datetime.utcnow()}
+             for business_id, (old, new) in assigned.items() if old]
+    if moved:
+        insert = sqlite_insert(redirects)
+        connection.execute(
+            insert.on_conflict_do_update(
+                index_elements=['slug'],
+                set_={'business_id': insert.excluded.business_id, 'created_at': insert.excluded.created_at}
+            ),
+            moved
+        )
+    return {business_id: new for business_id, (old, new) in assigned.items()}
+
+def resolve_slug(slug):
+    """(business, redirected) for a current or former slug, (None, False) if unknown"""
+    from .business import Business
+
+    business = Business.query.filter_by(slug=slug).first()
+    if business is not None:
+        return business, False
+    redirect = db.session.get(BusinessSlugRedirect, slug)
+    if redirect is None:
+        return None, False
+    return db.session.get(Business, redirect.business_id), True
+
+def refresh_slugs():
+    """Backfill or repair the slugs of every business"""
+    assigned = assign_slugs(db.session.connection())
+    db.session.commit()
+    return len(assigned)
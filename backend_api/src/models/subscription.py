@@ -2,8 +2,15 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 from .user import db
 
+BUSINESS_SUBSCRIPTION_TYPES = ('business_basic', 'business_premium', 'business_enterprise')
+
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        db.Index('ix_subscriptions_user_status', 'user_id', 'status'),
+        db.Index('ix_subscriptions_status', 'status'),
+        db.Index('ix_subscriptions_type_created', 'subscription_type', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -127,6 +134,10 @@ class Subscription(db.Model):
 
 class PaymentHistory(db.Model):
     __tablename__ = 'payment_history'
+    __table_args__ = (
+        db.Index('ix_payment_history_user_date', 'user_id', 'payment_date'),
+        db.Index('ix_payment_history_payment_date', 'payment_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     subscription_id = db.Column(db.Integer, db.ForeignKey('subscriptions.id'), nullable=False)
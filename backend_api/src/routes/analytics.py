@@ -1,75 +1,214 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta, date
+from flask import Blueprint, request, jsonify, current_app
+from datetime import datetime, timedelta
 from sqlalchemy import func, desc
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import json
 from ..models.user import db, User
 from ..models.business import Business
 from ..models.subscription import Subscription
-from ..models.analytics import UserActivity, BusinessAnalytics, PlatformMetrics, SearchAnalytics
+from ..models.analytics import (
+    UserActivity, BusinessAnalytics, PlatformMetrics, DAILY_COUNTERS, category_rank,
+    compute_platform_metrics, platform_metrics_watermark,
+    activity_partitions, search_partitions, DailySeries
+)
+from ..models.dimension import BusinessDimension
+from ..utils.ingest import EventBuffer
+from ..utils.hll import HyperLogLog, merged
 
 analytics_bp = Blueprint('analytics', __name__)
 
+MOVING_AVERAGE_DAYS = 7
+
+# Activity types that count towards a business's daily analytics
+BUSINESS_COUNTERS = {
+    'view_business': 'profile_views',
+    'phone_click': 'phone_clicks',
+    'website_click': 'website_clicks',
+    'direction_request': 'direction_requests',
+}
+
+def _optional_int(data, key):
+    value = data.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'{key} must be an integer')
+    return value
+
+def _optional_text(data, key):
+    value = data.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f'{key} must be a string')
+    return value
+
+def _required_text(data, key):
+    value = data.get(key)
+    if not isinstance(value, str) or not value:
+        raise ValueError(f'{key} is required')
+    return value
+
+def _visitor_key(event):
+    """Who a visitor is: the user if signed in, else the session, else the client"""
+    if event['user_id']:
+        return f"user:{event['user_id']}"
+    if event['session_id'] and event['session_id'] != 'anonymous':
+        return f"session:{event['session_id']}"
+    return f"client:{event['ip_address']}|{event['user_agent']}"
+
+def write_activities(app, events):
+    """Flush a batch of tracked activities and their business counters"""
+    with app.app_context():
+        activity_partitions.insert(events)
+        # Coalesced per (business, day, counter): one upsert row per
+        # business and day in the batch, however many clicks it had
+        counts = {}
+        visitors = {}
+        for event in events:
+            if not event['business_id']:
+                continue
+            # Event timestamps are UTC, and so are the days the dashboards read
+            key = (event['business_id'], event['timestamp'].date())
+            counts.setdefault(key, {})
+            visitors.setdefault(key, set()).add(_visitor_key(event))
+            column = BUSINESS_COUNTERS.get(event['activity_type'])
+            if column:
+                counts[key][column] = counts[key].get(column, 0) + 1
+        update_business_analytics(counts)
+        add_business_visitors(visitors)
+        db.session.commit()
+
+def write_searches(app, events):
+    """Flush a batch of tracked searches"""
+    with app.app_context():
+        search_partitions.insert(events)
+        db.session.commit()
+
+activity_buffer = EventBuffer('activity', write_activities)
+search_buffer = EventBuffer('search', write_searches)
+
+def _enqueue(buffer, event):
+    if not buffer.put(current_app._get_current_object(), event):
+        response = jsonify({'error': 'Too many events, try again shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return jsonify({'success': True, 'message': 'Event queued'}), 202
+
+def activity_event(data):
+    """Validated user_activities row for a tracked activity (ValueError if invalid)"""
+    return {
+        'user_id': _optional_int(data, 'user_id'),
+        'session_id': _optional_text(data, 'session_id') or 'anonymous',
+        'activity_type': _required_text(data, 'activity_type'),
+        'page_url': _optional_text(data, 'page_url'),
+        'referrer': _optional_text(data, 'referrer'),
+        'business_id': _optional_int(data, 'business_id'),
+        'search_query': _optional_text(data, 'search_query'),
+        'category': _optional_text(data, 'category'),
+        'location': _optional_text(data, 'location'),
+        'user_agent': request.headers.get('User-Agent'),
+        'ip_address': request.remote_addr,
+        'device_type': _optional_text(data, 'device_type'),
+        'duration': _optional_int(data, 'duration'),
+        'timestamp': datetime.utcnow()
+    }
+
+def search_event(data):
+    """Validated search_analytics row for a tracked search (ValueError if invalid)"""
+    return {
+        'user_id': _optional_int(data, 'user_id'),
+        'session_id': _optional_text(data, 'session_id') or 'anonymous',
+        'query': _required_text(data, 'query'),
+        'category': _optional_text(data, 'category'),
+        'location': _optional_text(data, 'location'),
+        'filters_used': json.dumps(data.get('filters', {})),
+        'results_count': _optional_int(data, 'results_count') or 0,
+        'clicked_business_id': _optional_int(data, 'clicked_business_id'),
+        'click_position': _optional_int(data, 'click_position'),
+        'search_time': datetime.utcnow()
+    }
+
 @analytics_bp.route('/track-activity', methods=['POST'])
 def track_activity():
-    """Track user activity for analytics"""
+    """Track user activity for analytics (written asynchronously)"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object is required'}), 400
     try:
-        data = request.get_json()
-        
-        activity = UserActivity(
-            user_id=data.get('user_id'),
-            session_id=data.get('session_id', 'anonymous'),
-            activity_type=data.get('activity_type'),
-            page_url=data.get('page_url'),
-            referrer=data.get('referrer'),
-            business_id=data.get('business_id'),
-            search_query=data.get('search_query'),
-            category=data.get('category'),
-            location=data.get('location'),
-            user_agent=request.headers.get('User-Agent'),
-            ip_address=request.remote_addr,
-            device_type=data.get('device_type'),
-            duration=data.get('duration')
-        )
-        
-        db.session.add(activity)
-        db.session.commit()
-        
-        # Update business analytics if business interaction
-        if data.get('business_id') and data.get('activity_type') in ['view_business', 'phone_click', 'website_click', 'direction_request']:
-            update_business_analytics(data.get('business_id'), data.get('activity_type'))
-        
-        return jsonify({'success': True, 'message': 'Activity tracked'})
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        event = activity_event(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return _enqueue(activity_buffer, event)
 
 @analytics_bp.route('/track-search', methods=['POST'])
 def track_search():
-    """Track search queries and results"""
+    """Track search queries and results (written asynchronously)"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object is required'}), 400
     try:
-        data = request.get_json()
-        
-        search = SearchAnalytics(
-            user_id=data.get('user_id'),
-            session_id=data.get('session_id', 'anonymous'),
-            query=data.get('query'),
-            category=data.get('category'),
-            location=data.get('location'),
-            filters_used=json.dumps(data.get('filters', {})),
-            results_count=data.get('results_count', 0),
-            clicked_business_id=data.get('clicked_business_id'),
-            click_position=data.get('click_position')
-        )
-        
-        db.session.add(search)
-        db.session.commit()
-        
-        return jsonify({'success': True, 'message': 'Search tracked'})
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        event = search_event(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return _enqueue(search_buffer, event)
+
+MAX_BATCH_EVENTS = 500
+_EVENT_TYPES = {
+    'activity': (activity_event, activity_buffer),
+    'search': (search_event, search_buffer),
+}
+
+@analytics_bp.route('/track-events', methods=['POST'])
+def track_events():
+    """Track a batch of activity and search events (written asynchronously).
+
+    The body is a JSON array of events, or {"events": [...]}, each with
+    "type": "activity" or "search" plus that endpoint's fields. It is
+    parsed whatever the Content-Type, since navigator.sendBeacon posts
+    text/plain. Invalid or refused events are reported per index and don't
+    affect the rest.
+    """
+    try:
+        data = json.loads(request.get_data(as_text=True) or 'null')
+    except ValueError:
+        return jsonify({'error': 'Body must be JSON'}), 400
+    events = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(events, list) or not events:
+        return jsonify({'error': 'A non-empty list of events is required'}), 400
+    if len(events) > MAX_BATCH_EVENTS:
+        return jsonify({'error': f'At most {MAX_BATCH_EVENTS} events per batch'}), 400
+
+    results = []
+    accepted = {kind: [] for kind in _EVENT_TYPES}
+    for index, data in enumerate(events):
+        kind = data.get('type') if isinstance(data, dict) else None
+        if kind not in _EVENT_TYPES:
+            results.append({'index': index, 'error': 'type must be activity or search'})
+            continue
+        try:
+            accepted[kind].append((index, _EVENT_TYPES[kind][0](data)))
+            results.append({'index': index, 'status': 'queued'})
+        except ValueError as e:
+            results.append({'index': index, 'error': str(e)})
+
+    app = current_app._get_current_object()
+    for kind, items in accepted.items():
+        buffer = _EVENT_TYPES[kind][1]
+        queued = buffer.put_many(app, [event for _, event in items])
+        for index, _ in items[queued:]:
+            results[index] = {'index': index, 'error': 'Too many events, try again shortly'}
+
+    queued = sum(1 for result in results if 'error' not in result)
+    return jsonify({
+        'success': True,
+        'queued': queued,
+        'rejected': len(results) - queued,
+        'results': results
+    }), 202
+
+@analytics_bp.route('/ingest/stats', methods=['GET'])
+def ingest_stats():
+    """Queue depth, drops and flush latency of the tracking pipeline"""
+    return jsonify({'activity': activity_buffer.stats(), 'search': search_buffer.stats()})
 
 @analytics_bp.route('/business/<int:business_id>/analytics', methods=['GET'])
 def get_business_analytics(business_id):
@@ -77,55 +216,49 @@ def get_business_analytics(business_id):
     try:
         # Get date range from query params
         days = int(request.args.get('days', 30))
-        start_date = date.today() - timedelta(days=days)
+        now = datetime.utcnow()
+        start_date = now.date() - timedelta(days=days)
         
         # Get business analytics
-        analytics = BusinessAnalytics.query.filter(
-            BusinessAnalytics.business_id == business_id,
-            BusinessAnalytics.date >= start_date
-        ).order_by(BusinessAnalytics.date.desc()).all()
+        series = DailySeries.load(business_id, start_date, now.date())
         
         # Calculate totals
-        total_views = sum(a.profile_views for a in analytics)
-        total_unique_visitors = sum(a.unique_visitors for a in analytics)
-        total_search_appearances = sum(a.search_appearances for a in analytics)
-        total_phone_clicks = sum(a.phone_clicks for a in analytics)
-        total_website_clicks = sum(a.website_clicks for a in analytics)
-        total_direction_requests = sum(a.direction_requests for a in analytics)
+        totals = series.totals(('profile_views', 'search_appearances', 'phone_clicks',
+                                'website_clicks', 'direction_requests'))
+        # Daily unique counts don't add up across days; merge the sketches
+        totals['unique_visitors'] = unique_visitors(business_id, start_date)
         
         # Get recent activity
-        recent_activity = UserActivity.query.filter(
-            UserActivity.business_id == business_id,
-            UserActivity.timestamp >= datetime.now() - timedelta(days=days)
-        ).order_by(UserActivity.timestamp.desc()).limit(50).all()
+        since = now - timedelta(days=days)
+        activities = activity_partitions.union(since, where=lambda t: [t.c.business_id == business_id])
+        recent_activity = db.session.execute(
+            db.select(activities).order_by(activities.c.timestamp.desc()).limit(50)
+        ).all()
         
         # Get search queries that led to this business
-        search_queries = db.session.query(
-            SearchAnalytics.query,
-            func.count(SearchAnalytics.id).label('count')
-        ).filter(
-            SearchAnalytics.clicked_business_id == business_id,
-            SearchAnalytics.search_time >= datetime.now() - timedelta(days=days)
-        ).group_by(SearchAnalytics.query).order_by(desc('count')).limit(10).all()
+        searches = search_partitions.union(since, where=lambda t: [t.c.clicked_business_id == business_id])
+        search_queries = db.session.execute(
+            db.select(searches.c.query, func.count().label('count'))
+            .group_by(searches.c.query).order_by(desc('count')).limit(10)
+        ).all()
         
         return jsonify({
             'success': True,
             'business_id': business_id,
             'date_range': {
                 'start_date': start_date.isoformat(),
-                'end_date': date.today().isoformat(),
+                'end_date': now.date().isoformat(),
                 'days': days
             },
-            'totals': {
-                'profile_views': total_views,
-                'unique_visitors': total_unique_visitors,
-                'search_appearances': total_search_appearances,
-                'phone_clicks': total_phone_clicks,
-                'website_clicks': total_website_clicks,
-                'direction_requests': total_direction_requests
+            'totals': totals,
+            'daily_analytics': series.rows(),
+            'moving_averages': {
+                'window_days': MOVING_AVERAGE_DAYS,
+                'dates': series.dates.astype(str).tolist(),
+                'profile_views': series.moving_average('profile_views', MOVING_AVERAGE_DAYS).round(2).tolist(),
+                'search_appearances': series.moving_average('search_appearances', MOVING_AVERAGE_DAYS).round(2).tolist()
             },
-            'daily_analytics': [a.to_dict() for a in analytics],
-            'recent_activity': [a.to_dict() for a in recent_activity],
+            'recent_activity': [UserActivity(**a._mapping).to_dict() for a in recent_activity],
             'top_search_queries': [{'query': q[0], 'count': q[1]} for q in search_queries]
         })
         
@@ -141,46 +274,27 @@ def get_business_performance(business_id):
             return jsonify({'error': 'Business not found'}), 404
         
         # Get performance data for last 30 days
-        thirty_days_ago = date.today() - timedelta(days=30)
-        sixty_days_ago = date.today() - timedelta(days=60)
+        today = datetime.utcnow().date()
+        thirty_days_ago = today - timedelta(days=30)
+        sixty_days_ago = today - timedelta(days=60)
         
-        # Current period analytics
-        current_analytics = BusinessAnalytics.query.filter(
-            BusinessAnalytics.business_id == business_id,
-            BusinessAnalytics.date >= thirty_days_ago
-        ).all()
-        
-        # Previous period analytics for comparison
-        previous_analytics = BusinessAnalytics.query.filter(
-            BusinessAnalytics.business_id == business_id,
-            BusinessAnalytics.date >= sixty_days_ago,
-            BusinessAnalytics.date < thirty_days_ago
-        ).all()
+        # Both periods in one load; the current period starts thirty days ago
+        series = DailySeries.load(business_id, sixty_days_ago, today)
         
         # Calculate metrics
-        current_views = sum(a.profile_views for a in current_analytics)
-        previous_views = sum(a.profile_views for a in previous_analytics)
+        current_views = series.total('profile_views', since=thirty_days_ago)
+        previous_views = series.total('profile_views', until=thirty_days_ago)
         views_change = ((current_views - previous_views) / max(previous_views, 1)) * 100
         
-        current_searches = sum(a.search_appearances for a in current_analytics)
-        previous_searches = sum(a.search_appearances for a in previous_analytics)
+        current_searches = series.total('search_appearances', since=thirty_days_ago)
+        previous_searches = series.total('search_appearances', until=thirty_days_ago)
         search_change = ((current_searches - previous_searches) / max(previous_searches, 1)) * 100
         
-        # Get category ranking
-        category_businesses = Business.query.filter_by(category=business.category).all()
-        business_scores = []
-        
-        for biz in category_businesses:
-            recent_analytics = BusinessAnalytics.query.filter(
-                BusinessAnalytics.business_id == biz.id,
-                BusinessAnalytics.date >= thirty_days_ago
-            ).all()
-            
-            score = sum(a.profile_views + a.search_appearances for a in recent_analytics)
-            business_scores.append((biz.id, score))
-        
-        business_scores.sort(key=lambda x: x[1], reverse=True)
-        category_rank = next((i + 1 for i, (bid, _) in enumerate(business_scores) if bid == business_id), len(business_scores))
+        # Category ranking: a point lookup in the periodically refreshed rank table
+        ranking = category_rank(business_id)
+        category_size = db.session.query(BusinessDimension.business_count).filter_by(
+            dimension='category', key=business.category_key
+        ).scalar() or 0
         
         return jsonify({
             'success': True,
@@ -197,12 +311,13 @@ def get_business_performance(business_id):
                     'change_percent': round(search_change, 1)
                 },
                 'category_ranking': {
-                    'rank': category_rank,
-                    'total_in_category': len(category_businesses),
-                    'category': business.category
+                    'rank': ranking[0] if ranking else category_size,
+                    'total_in_category': category_size,
+                    'category': business.category,
+                    'as_of': ranking[1].isoformat() if ranking else None
                 }
             },
-            'insights': generate_business_insights(business_id, current_analytics, previous_analytics)
+            'insights': generate_business_insights(business_id, series, thirty_days_ago)
         })
         
     except Exception as e:
@@ -210,41 +325,44 @@ def get_business_performance(business_id):
 
 @analytics_bp.route('/platform/metrics', methods=['GET'])
 def get_platform_metrics():
-    """Get platform-wide metrics (admin only)"""
+    """Get platform-wide metrics (admin only)
+
+    Closed days are read from the platform_metrics rollup, which
+    rollup_metrics.py keeps current; only today so far is computed from
+    the raw tables. Days the rollup hasn't reached yet are left out
+    (`rolled_up_through` says how far it got).
+    """
     try:
         days = int(request.args.get('days', 30))
-        start_date = date.today() - timedelta(days=days)
+        now = datetime.utcnow()
+        start_date = now.date() - timedelta(days=days)
+        watermark = platform_metrics_watermark()
         
         # Get platform metrics
         metrics = PlatformMetrics.query.filter(
             PlatformMetrics.date >= start_date
         ).order_by(PlatformMetrics.date.desc()).all()
         
-        # Calculate current totals
-        total_users = User.query.count()
-        active_subscriptions = Subscription.query.filter_by(status='active').count()
-        total_businesses = Business.query.count()
-        
-        # Recent activity summary
-        recent_searches = SearchAnalytics.query.filter(
-            SearchAnalytics.search_time >= datetime.now() - timedelta(days=days)
-        ).count()
+        live = compute_platform_metrics(now.date(), now)
+        latest = live[now.date()]
         
-        recent_views = UserActivity.query.filter(
-            UserActivity.activity_type == 'view_business',
-            UserActivity.timestamp >= datetime.now() - timedelta(days=days)
-        ).count()
+        active_subscriptions = Subscription.query.filter_by(status='active').count()
         
         return jsonify({
             'success': True,
             'current_totals': {
-                'total_users': total_users,
+                'total_users': latest['total_users'],
                 'active_subscriptions': active_subscriptions,
-                'total_businesses': total_businesses,
-                'recent_searches': recent_searches,
-                'recent_views': recent_views
+                'total_businesses': latest['total_businesses'],
+                'recent_searches': sum(m.total_searches for m in metrics) +
+                                   sum(values['total_searches'] for values in live.values()),
+                'recent_views': sum(m.total_views for m in metrics) +
+                                sum(values['total_views'] for values in live.values())
             },
-            'daily_metrics': [m.to_dict() for m in metrics]
+            'today': dict(latest, date=now.date().isoformat()),
+            'daily_metrics': [m.to_dict() for m in metrics],
+            'rolled_up_through': watermark.isoformat() if watermark else None,
+            'as_of': now.isoformat()
         })
         
     except Exception as e:
@@ -255,71 +373,98 @@ def get_user_activity(user_id):
     """Get user activity history"""
     try:
         days = int(request.args.get('days', 30))
-        start_date = datetime.now() - timedelta(days=days)
+        start_date = datetime.utcnow() - timedelta(days=days)
         
-        activities = UserActivity.query.filter(
-            UserActivity.user_id == user_id,
-            UserActivity.timestamp >= start_date
-        ).order_by(UserActivity.timestamp.desc()).limit(100).all()
+        events = activity_partitions.union(start_date, where=lambda t: [t.c.user_id == user_id])
+        activities = db.session.execute(
+            db.select(events).order_by(events.c.timestamp.desc()).limit(100)
+        ).all()
         
         # Activity summary
-        activity_counts = db.session.query(
-            UserActivity.activity_type,
-            func.count(UserActivity.id).label('count')
-        ).filter(
-            UserActivity.user_id == user_id,
-            UserActivity.timestamp >= start_date
-        ).group_by(UserActivity.activity_type).all()
+        activity_counts = db.session.execute(
+            db.select(events.c.activity_type, func.count().label('count')).group_by(events.c.activity_type)
+        ).all()
         
         return jsonify({
             'success': True,
             'user_id': user_id,
-            'activities': [a.to_dict() for a in activities],
+            'activities': [UserActivity(**a._mapping).to_dict() for a in activities],
             'activity_summary': [{'type': ac[0], 'count': ac[1]} for ac in activity_counts]
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def update_business_analytics(business_id, activity_type):
-    """Update business analytics based on activity"""
-    try:
-        today = date.today()
-        
-        # Get or create today's analytics record
-        analytics = BusinessAnalytics.query.filter_by(
-            business_id=business_id,
-            date=today
-        ).first()
-        
-        if not analytics:
-            analytics = BusinessAnalytics(business_id=business_id, date=today)
-            db.session.add(analytics)
-        
-        # Update metrics based on activity type
-        if activity_type == 'view_business':
-            analytics.profile_views += 1
-        elif activity_type == 'phone_click':
-            analytics.phone_clicks += 1
-        elif activity_type == 'website_click':
-            analytics.website_clicks += 1
-        elif activity_type == 'direction_request':
-            analytics.direction_requests += 1
-        elif activity_type == 'favorite':
-            analytics.favorites_added += 1
-        
-        db.session.commit()
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error updating business analytics: {e}")
+def update_business_analytics(counts):
+    """Add {(business_id, date): {column: n}} to the daily business analytics.
+
+    One executemany of INSERT ... ON CONFLICT (business_id, date) DO UPDATE
+    SET column = column + n, so concurrent writers never lose increments or
+    create duplicate daily rows. Runs in the caller's transaction.
+    """
+    if not counts:
+        return
+    table = BusinessAnalytics.__table__
+    statement = sqlite_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=['business_id', 'date'],
+        set_={c: func.coalesce(table.c[c], 0) + statement.excluded[c] for c in DAILY_COUNTERS}
+    )
+    db.session.execute(statement, [
+        dict({c: columns.get(c, 0) for c in DAILY_COUNTERS}, business_id=business_id, date=day)
+        for (business_id, day), columns in counts.items()
+    ])
+
+def add_business_visitors(visitors):
+    """Add {(business_id, date): visitor keys} to the daily visitor sketches.
+
+    The daily rows must exist (update_business_analytics creates them).
+    Sketches are read, merged and written back in the caller's transaction,
+    which already holds SQLite's write lock from the counter upsert, so
+    concurrent flushes can't lose each other's visitors.
+    """
+    if not visitors:
+        return
+    table = BusinessAnalytics.__table__
+    rows = db.session.execute(
+        db.select(table.c.id, table.c.business_id, table.c.date, table.c.visitor_sketch)
+        .where(table.c.business_id.in_({b for b, _ in visitors}), table.c.date.in_({d for _, d in visitors}))
+    ).all()
+
+    params = []
+    for row in rows:
+        keys = visitors.get((row.business_id, row.date))
+        if not keys:
+            continue
+        sketch = HyperLogLog.from_bytes(row.visitor_sketch) if row.visitor_sketch else HyperLogLog()
+        sketch.update(keys)
+        params.append({'row_id': row.id, 'b_sketch': sketch.to_bytes(), 'b_unique': sketch.count()})
+    if params:
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('row_id')).values(
+                visitor_sketch=db.bindparam('b_sketch'), unique_visitors=db.bindparam('b_unique')
+            ),
+            params
+        )
+
+def unique_visitors(business_id, start_date, end_date=None):
+    """Distinct visitors of a business over a date range, from the merged daily sketches"""
+    query = db.select(BusinessAnalytics.visitor_sketch).where(
+        BusinessAnalytics.business_id == business_id,
+        BusinessAnalytics.date >= start_date,
+        BusinessAnalytics.visitor_sketch.isnot(None)
+    )
+    if end_date is not None:
+        query = query.where(BusinessAnalytics.date <= end_date)
+    return merged(db.session.execute(query).scalars()).count()
 
-def generate_business_insights(business_id, current_analytics, previous_analytics):
-    """Generate insights and recommendations for business"""
+def generate_business_insights(business_id, series, period_start):
+    """Generate insights and recommendations for business (the current
+    period of `series` starts at `period_start`)"""
     insights = []
     
-    current_views = sum(a.profile_views for a in current_analytics)
-    previous_views = sum(a.profile_views for a in previous_analytics)
+    current_views = series.total('profile_views', since=period_start)
+    previous_views = series.total('profile_views', until=period_start)
     
     if current_views > previous_views * 1.2:
         insights.append({
@@ -1,64 +1,267 @@
-from flask import Blueprint, jsonify, request
-from sqlalchemy import or_, and_
+from flask import Blueprint, jsonify, request, redirect, url_for
+from sqlalchemy import or_, and_, case, false
+from sqlalchemy.orm import selectinload
 from src.models.business import Business, db
 from src.models.review import Review
+from src.models.dimension import BusinessDimension, canonical_key
+from src.models.business_batch import apply_business_batch, BatchError
+from src.models.slug import resolve_slug
+from src.models.search import apply_search, build_match_query, search_rank
+from src.models.geo import apply_bounds, apply_radius, haversine_km, squared_distance_expr
+from src.utils.pagination import keyset_paginate, encode_cursor, decode_cursor, page_count, MAX_PER_PAGE
+from src.indexes.facets import facet_index
+from src.indexes.suggest import suggest_index
+from src.indexes.trigram import name_index, city_index
+from src.indexes.ranking import rank_page
+from src.utils.http_cache import cached_read
 
 business_bp = Blueprint('business', __name__)
 
-@business_bp.route('/businesses', methods=['GET'])
-def get_businesses():
-    """Get businesses with optional filtering"""
-    # Get query parameters
+def apply_filters(query, fuzzy=False):
+    """Apply the city/state/category/minority_type filters from the query string.
+
+    Values are matched exactly on their canonical keys, so each filter is
+    an index seek ("buffalo" matches "Buffalo" but not "East Buffalo").
+    With `fuzzy`, the city also matches similarly spelled known cities.
+    """
     city = request.args.get('city')
     state = request.args.get('state')
     category = request.args.get('category')
     minority_type = request.args.get('minority_type')
+    
+    if city and fuzzy:
+        city_keys = [city_key for city_key, _ in city_index.search(city, limit=5)]
+        query = query.filter(Business.city_key.in_(city_keys))
+    elif city:
+        query = query.filter(Business.city_key == canonical_key(city))
+    if state:
+        query = query.filter(Business.state_key == canonical_key(state))
+    if category and category.lower() != 'all':
+        query = query.filter(Business.category_key == canonical_key(category))
+    if minority_type:
+        query = query.filter(Business.minority_type_key == canonical_key(minority_type))
+    
+    return query
+
+FUZZY_LIMIT = 200
+
+def fuzzy_matches(search, match):
+    """[(business id, score)] for a typo-tolerant name search, best first.
+
+    Businesses the plain full-text search finds count as exact matches
+    (score 1.0), so fuzzy results never miss what the plain search returns.
+    """
+    scores = dict(name_index.search(search, limit=FUZZY_LIMIT))
+    exact = apply_search(db.session.query(Business.id), match).order_by(search_rank).limit(FUZZY_LIMIT)
+    for business_id, in exact:
+        scores[business_id] = 1.0
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+@business_bp.route('/businesses', methods=['GET'])
+@cached_read
+def get_businesses():
+    """Get businesses with optional filtering"""
+    # Get query parameters
     search = request.args.get('search')
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 20, type=int)
+    include_total = request.args.get('include_total', 'true').lower() != 'false'
+    fuzzy = request.args.get('fuzzy', 'false').lower() == 'true'
+    match = build_match_query(search)
+    
+    if request.args.get('sort') == 'relevance':
+        return _ranked_businesses(search, match, fuzzy, cursor, per_page, include_total)
     
     # Build query
-    query = Business.query
+    query = apply_filters(Business.query, fuzzy=fuzzy)
+    order_by = [Business.id]
     
-    # Apply filters
-    if city:
-        query = query.filter(Business.city.ilike(f'%{city}%'))
-    if state:
-        query = query.filter(Business.state.ilike(f'%{state}%'))
-    if category and category.lower() != 'all':
-        query = query.filter(Business.category.ilike(f'%{category}%'))
-    if minority_type:
-        query = query.filter(Business.minority_type.ilike(f'%{minority_type}%'))
-    if search:
-        query = query.filter(or_(
-            Business.name.ilike(f'%{search}%'),
-            Business.description.ilike(f'%{search}%'),
-            Business.category.ilike(f'%{search}%')
-        ))
+    if match and fuzzy:
+        # Typo-tolerant name match, most similar first
+        matches = fuzzy_matches(search, match)
+        if matches:
+            query = query.filter(Business.id.in_([business_id for business_id, _ in matches]))
+            order_by = [case({business_id: -score for business_id, score in matches}, value=Business.id), Business.id]
+        else:
+            query = query.filter(false())
+    elif match:
+        query = apply_search(query, match)
+        order_by = [search_rank, Business.id]
     
     # Paginate results
-    businesses = query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
+    try:
+        page = keyset_paginate(query, order_by, cursor=cursor, per_page=per_page,
+                               include_total=include_total)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page.to_dict('businesses'))
+
+def _ranked_businesses(search, match, fuzzy, cursor, per_page, include_total):
+    """Page of filtered businesses ordered by the relevance ranking.
+
+    Combines text match, rating, review volume, verification, distance
+    (when lat/lng are given) and premium placement; explain=true adds the
+    score breakdown to each business.
+    """
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    explain = request.args.get('explain', 'false').lower() == 'true'
+    
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    try:
+        cursor_key = decode_cursor(cursor, 2) if cursor else None
+        # (negated score, id), as rank_page returns it
+        if cursor_key and not all(isinstance(value, kind) and not isinstance(value, bool)
+                                  for value, kind in zip(cursor_key, ((int, float), int))):
+            raise ValueError('Invalid cursor')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Candidate ids (and raw text match strength) straight from the indexes
+    query = apply_filters(db.session.query(Business.id), fuzzy=fuzzy)
+    text_scores = None
+    if match and fuzzy:
+        similarity = dict(fuzzy_matches(search, match))
+        ids = [business_id for business_id, in query.filter(Business.id.in_(list(similarity))).all()]
+        text_scores = [similarity[business_id] for business_id in ids]
+    elif match:
+        rows = apply_search(query.add_columns(search_rank), match).all()
+        ids = [business_id for business_id, _ in rows]
+        text_scores = [-rank for _, rank in rows]  # bm25 rank: lower is better
+    else:
+        ids = [business_id for business_id, in query.all()]
+    
+    page_ids, explanations, next_key = rank_page(
+        ids, cursor_key, per_page=per_page,
+        text_scores=text_scores, lat=lat, lng=lng
     )
     
-    return jsonify({
-        'businesses': [business.to_dict() for business in businesses.items],
-        'total': businesses.total,
-        'pages': businesses.pages,
-        'current_page': page,
+    businesses = {business.id: business for business in Business.query.filter(Business.id.in_(page_ids))}
+    items = []
+    for business_id in page_ids:
+        data = businesses[business_id].to_dict()
+        if explain:
+            data['ranking'] = explanations[business_id]
+        items.append(data)
+    
+    data = {
+        'businesses': items,
         'per_page': per_page,
-        'has_next': businesses.has_next,
-        'has_prev': businesses.has_prev
+        'has_next': next_key is not None,
+        'next_cursor': encode_cursor(next_key) if next_key else None
+    }
+    if include_total:
+        data['total'] = len(ids)
+        data['pages'] = page_count(len(ids), per_page)
+    return jsonify(data)
+
+@business_bp.route('/businesses/facets', methods=['GET'])
+@cached_read
+def get_business_facets():
+    """Get per-value business counts for the current filters"""
+    search = request.args.get('search')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    
+    filters = {}
+    for dimension in ('category', 'minority_type', 'state'):
+        key = canonical_key(request.args.get(dimension))
+        if key and key != 'all':
+            filters[dimension] = key
+    city = canonical_key(request.args.get('city'))
+    if city:
+        filters['city'] = f"{filters['state']}|{city}" if 'state' in filters else city
+    is_verified = request.args.get('is_verified')
+    if is_verified:
+        filters['is_verified'] = 'true' if is_verified.lower() == 'true' else 'false'
+    
+    restrict_ids = None
+    match = build_match_query(search)
+    if match:
+        rows = apply_search(db.session.query(Business.id), match).all()
+        restrict_ids = [business_id for business_id, in rows]
+    
+    total, facets = facet_index.counts(filters, restrict_ids=restrict_ids, limit=limit)
+    return jsonify({
+        'total': total,
+        'filters': filters,
+        'facets': facets
+    })
+
+@business_bp.route('/businesses/nearby', methods=['GET'])
+@cached_read
+def get_nearby_businesses():
+    """Get businesses within a radius of a point, nearest first"""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius_km = request.args.get('radius_km', 10, type=float)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    
+    if lat is None or lng is None or not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        return jsonify({'error': 'Valid lat and lng parameters are required'}), 400
+    if radius_km <= 0 or radius_km > 500:
+        return jsonify({'error': 'radius_km must be between 0 and 500'}), 400
+    
+    query = apply_radius(apply_filters(Business.query), lat, lng, radius_km)
+    businesses = query.limit(limit).all()
+    
+    return jsonify({
+        'businesses': [_with_distance(business, lat, lng) for business in businesses],
+        'total': len(businesses),
+        'center': {'lat': lat, 'lng': lng},
+        'radius_km': radius_km
+    })
+
+@business_bp.route('/businesses/within', methods=['GET'])
+@cached_read
+def get_businesses_in_bounds():
+    """Get businesses inside a map viewport, nearest to its center first"""
+    bounds = [request.args.get(name, type=float) for name in ('min_lat', 'max_lat', 'min_lng', 'max_lng')]
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    
+    if None in bounds or bounds[0] > bounds[1] or bounds[2] > bounds[3]:
+        return jsonify({'error': 'Valid min_lat, max_lat, min_lng and max_lng parameters are required'}), 400
+    
+    min_lat, max_lat, min_lng, max_lng = bounds
+    lat = request.args.get('lat', (min_lat + max_lat) / 2, type=float)
+    lng = request.args.get('lng', (min_lng + max_lng) / 2, type=float)
+    
+    query = apply_bounds(apply_filters(Business.query), min_lat, max_lat, min_lng, max_lng)
+    query = query.order_by(squared_distance_expr(lat, lng))
+    businesses = query.limit(limit).all()
+    
+    return jsonify({
+        'businesses': [_with_distance(business, lat, lng) for business in businesses],
+        'total': len(businesses),
+        'bounds': dict(zip(('min_lat', 'max_lat', 'min_lng', 'max_lng'), bounds))
     })
 
+def _with_distance(business, lat, lng):
+    data = business.to_dict()
+    data['distance_km'] = round(haversine_km(lat, lng, business.latitude, business.longitude), 2)
+    return data
+
 @business_bp.route('/businesses/<int:business_id>', methods=['GET'])
+@cached_read
 def get_business(business_id):
     """Get a specific business with reviews"""
-    business = Business.query.get_or_404(business_id)
+    # Load the reviews and their authors in one extra query
+    business = Business.query.options(
+        selectinload(Business.reviews).joinedload(Review.user)
+    ).get_or_404(business_id)
     return jsonify(business.to_dict_with_reviews())
 
+@business_bp.route('/businesses/by-slug/<slug>', methods=['GET'])
+@cached_read
+def get_business_by_slug(slug):
+    """Get a business by the slug of its profile page; former slugs redirect"""
+    business, redirected = resolve_slug(slug)
+    if business is None:
+        return jsonify({'error': 'Business not found'}), 404
+    if redirected:
+        return redirect(url_for('business.get_business_by_slug', slug=business.slug), 301)
+    return jsonify(business.to_dict())
+
 @business_bp.route('/businesses', methods=['POST'])
 def create_business():
     """Create a new business"""
@@ -110,7 +313,26 @@ def delete_business(business_id):
     db.session.commit()
     return '', 204
 
+@business_bp.route('/businesses/batch', methods=['POST'])
+def batch_businesses():
+    """Create, update and delete many businesses in one transaction"""
+    data = request.get_json(silent=True) or {}
+    atomic = bool(data.get('atomic', False))
+    try:
+        results = apply_business_batch(data.get('operations'), atomic=atomic)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+
+    failed = sum(1 for result in results if 'error' in result)
+    return jsonify({
+        'results': results,
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'applied': not (atomic and failed)
+    }), 400 if atomic and failed else 200
+
 @business_bp.route('/search', methods=['GET'])
+@cached_read
 def search_businesses():
     """Search businesses by location"""
     city = request.args.get('city', '').strip()
@@ -119,10 +341,10 @@ def search_businesses():
     if not city:
         return jsonify({'error': 'City parameter is required'}), 400
     
-    query = Business.query.filter(Business.city.ilike(f'%{city}%'))
+    query = Business.query.filter(Business.city_key == canonical_key(city))
     
     if state:
-        query = query.filter(Business.state.ilike(f'%{state}%'))
+        query = query.filter(Business.state_key == canonical_key(state))
     
     businesses = query.all()
     
@@ -132,15 +354,36 @@ def search_businesses():
         'location': f"{city}, {state}" if state else city
     })
 
+@business_bp.route('/suggest', methods=['GET'])
+def suggest():
+    """Typeahead suggestions for business names, cities and categories"""
+    q = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 25)
+    return jsonify({
+        'query': q,
+        'suggestions': suggest_index.suggest(q, limit=limit)
+    })
+
+@business_bp.route('/suggest/stats', methods=['GET'])
+def suggest_stats():
+    """Size and memory use of the typeahead index"""
+    return jsonify(suggest_index.stats())
+
 @business_bp.route('/categories', methods=['GET'])
+@cached_read
 def get_categories():
     """Get all business categories"""
-    categories = db.session.query(Business.category).distinct().all()
-    return jsonify([category[0] for category in categories if category[0]])
+    return jsonify(_dimension_labels('category'))
 
 @business_bp.route('/cities', methods=['GET'])
+@cached_read
 def get_cities():
     """Get all cities with businesses"""
-    cities = db.session.query(Business.city, Business.state).distinct().all()
-    return jsonify([f"{city}, {state}" for city, state in cities if city and state])
+    return jsonify(_dimension_labels('city'))
 
+def _dimension_labels(dimension):
+    rows = db.session.query(BusinessDimension.label).filter(
+        BusinessDimension.dimension == dimension,
+        BusinessDimension.business_count > 0
+    ).order_by(BusinessDimension.label).all()
+    return [label for label, in rows]
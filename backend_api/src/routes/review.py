@@ -1,33 +1,37 @@
 from flask import Blueprint, jsonify, request
+from sqlalchemy.orm import joinedload
 from src.models.review import Review, db
 from src.models.business import Business
 from src.models.user import User
+from src.utils.pagination import keyset_paginate
+from src.utils.http_cache import cached_read
 
 review_bp = Blueprint('review', __name__)
 
 @review_bp.route('/businesses/<int:business_id>/reviews', methods=['GET'])
+@cached_read
 def get_business_reviews(business_id):
-    """Get all reviews for a specific business"""
+    """Get reviews for a specific business, newest first"""
     business = Business.query.get_or_404(business_id)
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
+    include_total = request.args.get('include_total', 'true').lower() != 'false'
     
-    reviews = Review.query.filter_by(business_id=business_id).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+    try:
+        reviews = keyset_paginate(
+            Review.query.options(joinedload(Review.user)).filter_by(business_id=business_id),
+            [Review.id],
+            cursor=cursor,
+            per_page=per_page,
+            descending=True,
+            include_total=include_total
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'reviews': [review.to_dict() for review in reviews.items],
-        'total': reviews.total,
-        'pages': reviews.pages,
-        'current_page': page,
-        'per_page': per_page,
-        'has_next': reviews.has_next,
-        'has_prev': reviews.has_prev,
-        'business': business.to_dict()
-    })
+    data = reviews.to_dict('reviews')
+    data['business'] = business.to_dict()
+    return jsonify(data)
 
 @review_bp.route('/businesses/<int:business_id>/reviews', methods=['POST'])
 def create_review(business_id):
@@ -73,9 +77,10 @@ def create_review(business_id):
     return jsonify(review.to_dict()), 201
 
 @review_bp.route('/reviews/<int:review_id>', methods=['GET'])
+@cached_read
 def get_review(review_id):
     """Get a specific review"""
-    review = Review.query.get_or_404(review_id)
+    review = Review.query.options(joinedload(Review.user)).get_or_404(review_id)
     return jsonify(review.to_dict())
 
 @review_bp.route('/reviews/<int:review_id>', methods=['PUT'])
@@ -106,26 +111,27 @@ def delete_review(review_id):
     return '', 204
 
 @review_bp.route('/users/<int:user_id>/reviews', methods=['GET'])
+@cached_read
 def get_user_reviews(user_id):
-    """Get all reviews by a specific user"""
+    """Get reviews by a specific user, newest first"""
     user = User.query.get_or_404(user_id)
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
+    include_total = request.args.get('include_total', 'true').lower() != 'false'
     
-    reviews = Review.query.filter_by(user_id=user_id).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+    try:
+        reviews = keyset_paginate(
+            Review.query.options(joinedload(Review.user)).filter_by(user_id=user_id),
+            [Review.id],
+            cursor=cursor,
+            per_page=per_page,
+            descending=True,
+            include_total=include_total
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'reviews': [review.to_dict() for review in reviews.items],
-        'total': reviews.total,
-        'pages': reviews.pages,
-        'current_page': page,
-        'per_page': per_page,
-        'has_next': reviews.has_next,
-        'has_prev': reviews.has_prev,
-        'user': user.to_dict()
-    })
+    data = reviews.to_dict('reviews')
+    data['user'] = user.to_dict()
+    return jsonify(data)
 
@@ -0,0 +1,101 @@
+import json
+import os
+from datetime import datetime
+import numpy as np
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, func, select
+
+MANIFEST = 'manifest.json'
+
+def column_dtype(column):
+    """NumPy dtype for a table column, None if it has no fixed-width form"""
+    if isinstance(column.type, Boolean):
+        return np.dtype(np.bool_)
+    if isinstance(column.type, Integer):
+        return np.dtype(np.int64)
+    if isinstance(column.type, Float):
+        return np.dtype(np.float64)
+    if isinstance(column.type, DateTime):
+        return np.dtype('datetime64[us]')
+    if isinstance(column.type, Date):
+        return np.dtype('datetime64[D]')
+    return None
+
+def to_array(values, dtype):
+    """A list of column values as a `dtype` array (None becomes 0, NaN or NaT)"""
+    if dtype.kind == 'M':
+        return np.array(['NaT' if value is None else value for value in values], dtype=dtype)
+    if dtype.kind == 'f':
+        return np.array([np.nan if value is None else value for value in values], dtype=dtype)
+    return np.fromiter((value or 0 for value in values), dtype=dtype, count=len(values))
+
+def needs_mask(column, dtype):
+    """Whether NULLs of a column are lost in its array (integers and booleans)"""
+    return column.nullable and dtype.kind in 'bi'
+
+def export_table(connection, table, directory, chunk_size=100000):
+    """Write the fixed-width columns of `table` to <directory>/<table>/<column>.npy.
+
+    Each file is a plain .npy array (np.load(path, mmap_mode='r') maps it
+    without reading it), filled chunk by chunk through a memory map so
+    memory stays flat. Integer and boolean arrays have no NULL value, so
+    nullable ones also get a <column>.mask.npy boolean array that is True
+    where the row holds NULL. Rows inserted while the export runs are left out.
+    Returns {'rows': n, 'columns': {name: dtype}, 'masks': [name, ...]}.
+    """
+    columns = [(column, column_dtype(column)) for column in table.columns]
+    columns = [(column, dtype) for column, dtype in columns if dtype is not None]
+    masked = [index for index, (column, dtype) in enumerate(columns) if needs_mask(column, dtype)]
+    key = table.c.id
+    last_id = connection.execute(select(func.max(key))).scalar() or 0
+    rows = connection.execute(select(func.count()).select_from(table).where(key <= last_id)).scalar()
+
+    folder = os.path.join(directory, table.name)
+    os.makedirs(folder, exist_ok=True)
+    arrays = [np.lib.format.open_memmap(os.path.join(folder, f'{column.name}.npy'), mode='w+',
+                                        dtype=dtype, shape=(rows,))
+              for column, dtype in columns]
+    masks = {index: np.lib.format.open_memmap(os.path.join(folder, f'{columns[index][0].name}.mask.npy'),
+                                              mode='w+', dtype=np.bool_, shape=(rows,))
+             for index in masked}
+
+    position = 0
+    result = connection.execute(
+        select(*[column for column, _ in columns]).where(key <= last_id).order_by(key)
+    ).yield_per(chunk_size)
+    for chunk in result.partitions():
+        if position + len(chunk) > rows:
+            raise RuntimeError(f'{table.name} changed during the export')
+        for index, (column, dtype) in enumerate(columns):
+            values = [row[index] for row in chunk]
+            arrays[index][position:position + len(chunk)] = to_array(values, dtype)
+            if index in masks:
+                masks[index][position:position + len(chunk)] = [value is None for value in values]
+        position += len(chunk)
+    if position != rows:
+        raise RuntimeError(f'{table.name} changed during the export')
+    for array in arrays + list(masks.values()):
+        array.flush()
+    return {'rows': rows, 'columns': {column.name: dtype.str for column, dtype in columns},
+            'masks': [columns[index][0].name for index in masked]}
+
+def write_manifest(directory, tables, **details):
+    manifest = dict(details, exported_at=datetime.utcnow().isoformat(), tables=tables)
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def open_table(directory, name):
+    """{column: read-only memory-mapped array} of a table in an export.
+
+    Columns exported with a null mask come back as masked arrays over the
+    mapped data and mask.
+    """
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    details = manifest['tables'][name]
+    arrays = {column: np.load(os.path.join(directory, name, f'{column}.npy'), mmap_mode='r')
+              for column in details['columns']}
+    for column in details.get('masks', ()):
+        mask = np.load(os.path.join(directory, name, f'{column}.mask.npy'), mmap_mode='r')
+        arrays[column] = np.ma.MaskedArray(arrays[column], mask=mask, copy=False)
+    return arrays
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from ..models.catalog import current_catalog_version
+
+DEFAULT_CACHE_SIZE = 512
+
+class ResponseCache:
+    """Bounded LRU of serialized read responses for one catalog version.
+
+    Entries are keyed by the path and the normalized query string. Any
+    catalog write bumps the version, which empties the cache on the next
+    read, so create/update/delete of businesses and reviews invalidate it.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, key):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, key, entry):
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'version': self._version,
+                    'hits': self.hits, 'misses': self.misses}
+
+response_cache = ResponseCache()
+
+def _cache_key():
+    params = sorted((key, value) for key, values in request.args.lists() for value in values)
+    return request.path, tuple(params)
+
+def cached_read(view):
+    """Serve a catalog read with validators and a server-side response cache.
+
+    The ETag and Last-Modified headers come from the catalog version, so
+    a matching If-None-Match gets a 304 before the view runs. Every
+    response carries the ETag, so If-Modified-Since is ignored: it only
+    has one-second precision and would miss writes made in the same second.
+    Otherwise a cached body for the same path and query parameters is
+    returned if the catalog hasn't changed since it was rendered.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, changed_at = current_catalog_version()
+        # The timestamp keeps ETags unique if the database is recreated
+        etag = f'catalog-{version}-{int(changed_at.timestamp()) if changed_at else 0}'
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            key = _cache_key()
+            cached = response_cache.get(version, key)
+            if cached is not None:
+                body, status, mimetype = cached
+                response = current_app.response_class(body, status=status, mimetype=mimetype)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response_cache.put(version, key, (response.get_data(), response.status_code, response.mimetype))
+
+        response.set_etag(etag)
+        if changed_at:
+            response.last_modified = changed_at
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
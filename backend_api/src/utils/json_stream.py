@@ -0,0 +1,60 @@
+import json
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """Yield the items of a top-level JSON array read from a text stream.
+
+    Items are decoded one at a time from a rolling buffer, so memory is
+    bounded by the chunk size plus the largest item instead of the whole
+    document. Raises ValueError if the input isn't a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    expecting = 'start'  # then 'first', 'value' or 'separator'
+
+    while True:
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+
+        if position == len(buffer):
+            if eof:
+                raise ValueError('Unexpected end of JSON array')
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        char = buffer[position]
+        if expecting == 'start':
+            if char != '[':
+                raise ValueError('Expected a JSON array')
+            position += 1
+            expecting = 'first'
+            continue
+        if expecting in ('first', 'separator') and char == ']':
+            return
+        if expecting == 'separator':
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" at offset {position}')
+            position += 1
+            expecting = 'value'
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+            # A scalar running to the end of the buffer may be cut short
+            complete = eof or end < len(buffer) or isinstance(item, (dict, list))
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        yield item
+        position = end
+        expecting = 'separator'
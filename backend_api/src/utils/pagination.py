@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+from sqlalchemy import tuple_
+
+MAX_PER_PAGE = 100
+
+def encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by encode_cursor, raising ValueError if invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+def page_count(total, per_page):
+    """Number of pages of `per_page` rows needed for `total` rows, None if uncounted"""
+    return None if total is None else -(-total // per_page)
+
+class KeysetPage:
+    """One page of a keyset-paginated query"""
+
+    def __init__(self, items, next_cursor, per_page, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def pages(self):
+        return page_count(self.total, self.per_page)
+
+    def to_dict(self, key):
+        data = {
+            key: [item.to_dict() for item in self.items],
+            'per_page': self.per_page,
+            'has_next': self.has_next,
+            'next_cursor': self.next_cursor
+        }
+        if self.total is not None:
+            data['total'] = self.total
+            data['pages'] = self.pages
+        return data
+
+def keyset_paginate(query, order_by, cursor=None, per_page=20, descending=False, include_total=False):
+    """Paginate `query` by seeking past the sort key in `cursor`.
+
+    `order_by` is a list of columns forming a unique sort key (it must end
+    with a primary key). Each page is a single index seek plus LIMIT, so
+    deep pages cost the same as the first one. The total is only counted
+    when asked for, since that is a full scan of the filtered set.
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    total = query.order_by(None).count() if include_total else None
+
+    key = tuple_(*order_by)
+    if cursor:
+        values = tuple_(*decode_cursor(cursor, len(order_by)))
+        query = query.filter(key < values if descending else key > values)
+
+    ordering = [column.desc() for column in order_by] if descending else list(order_by)
+    rows = query.add_columns(*order_by).order_by(*ordering).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1][1:])
+
+    return KeysetPage([row[0] for row in rows], next_cursor, per_page, total)
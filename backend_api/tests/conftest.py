@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.user import db
+from src.models.catalog import init_catalog_version
+from src.models.search import init_search_index
+from src.models import subscription  # noqa: F401 (creates its tables; the ranking reads them)
+from src.routes.business import business_bp
+from src.routes.review import review_bp
+from src.routes.user import user_bp
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    app.register_blueprint(business_bp, url_prefix='/api')
+    app.register_blueprint(review_bp, url_prefix='/api')
+    app.register_blueprint(user_bp, url_prefix='/api')
+    with app.app_context():
+        db.create_all()
+        init_search_index()
+        init_catalog_version()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,100 @@
+"""Writes committed by another worker process reach this process's indexes.
+
+Core statements skip the ORM commit hooks, so they stand in for a write
+made by a different process.
+"""
+import pytest
+
+from src.models.business import Business, db
+from src.models.catalog import mark_bulk_change, catalog_feed
+from src.indexes.facets import facet_index
+from src.indexes.suggest import suggest_index
+from src.indexes.trigram import name_index
+
+businesses = Business.__table__
+
+def insert_business(name, category='Restaurant'):
+    result = db.session.execute(businesses.insert().values(
+        name=name, address='1 Main St', city='Buffalo', state='NY', category=category,
+        minority_type='Black-owned', city_key='buffalo', state_key='ny',
+        category_key=category.lower(), minority_type_key='black-owned'
+    ))
+    db.session.commit()
+    return result.inserted_primary_key[0]
+
+@pytest.fixture
+def immediate(app, monkeypatch):
+    # Check for other processes' writes on every lookup
+    monkeypatch.setattr(catalog_feed, 'check_seconds', 0)
+
+@pytest.fixture
+def loaded(immediate):
+    insert_business('Rochester Jazz Lounge')
+    for index in (facet_index, suggest_index, name_index):
+        index.load()
+
+def category_count(category):
+    total, facets = facet_index.counts({})
+    return {value['key']: value['count'] for value in facets['category']}.get(category, 0)
+
+def test_other_process_insert_update_delete(loaded):
+    business_id = insert_business('Harlem Bakery', category='Bakery')
+    assert category_count('bakery') == 1
+    assert [s['label'] for s in suggest_index.suggest('harlem')] == ['Harlem Bakery']
+    assert [ref for ref, _ in name_index.search('bakery')] == [business_id]
+
+    db.session.execute(businesses.update().where(businesses.c.id == business_id)
+                       .values(name='Harlem Pastry', category='Cafe', category_key='cafe'))
+    db.session.commit()
+    assert category_count('bakery') == 0
+    assert category_count('cafe') == 1
+    assert name_index.search('bakery') == []
+
+    db.session.execute(businesses.delete().where(businesses.c.id == business_id))
+    db.session.commit()
+    assert category_count('cafe') == 0
+    assert suggest_index.suggest('harlem') == []
+
+def test_bulk_change_reloads(loaded):
+    db.session.execute(businesses.update().values(category='Bar', category_key='bar'))
+    db.session.execute(db.text('DELETE FROM catalog_changes'))
+    mark_bulk_change()
+    db.session.commit()
+    assert category_count('bar') == 1
+    assert category_count('restaurant') == 0
+
+def test_lookups_between_checks_stay_in_memory(app, monkeypatch):
+    from tests.test_query_counts import count_queries
+
+    monkeypatch.setattr(catalog_feed, 'check_seconds', 60)
+    insert_business('Harlem Bakery')
+    suggest_index.load()
+    suggest_index.suggest('har')
+    with count_queries() as statements:
+        for _ in range(100):
+            assert suggest_index.suggest('harl')
+    assert statements == []
+
+def test_subscription_changes_reach_the_ranking(immediate):
+    from src.models.catalog import current_catalog_version
+    from src.models.subscription import Subscription
+    from src.indexes.ranking import ranking_features
+
+    business_id = insert_business('Asempe Kitchen')
+    ranking_features.load()
+
+    def premium():
+        ids, scores, components = ranking_features.score([business_id])
+        return components['premium'][0] > 0
+
+    version = current_catalog_version()[0]
+    subscription = Subscription(1, 'business_premium', 49.99, business_id=business_id)
+    db.session.add(subscription)
+    db.session.commit()
+    assert current_catalog_version()[0] > version
+    assert premium()
+
+    version = current_catalog_version()[0]
+    subscription.cancel()
+    assert current_catalog_version()[0] > version
+    assert not premium()
@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from src.models.user import db
+from src.models.business import Business
+from src.models.analytics import BusinessAnalytics, DailySeries
+from src.utils.columnar import export_table, open_table, write_manifest
+
+def test_rows_match_to_dict(app):
+    business = Business(name='Asempe Kitchen', address='1 Main St', city='Buffalo', state='NY',
+                        category='Restaurant', minority_type='Black-owned')
+    db.session.add(business)
+    db.session.flush()
+    start = date(2026, 9, 1)
+    db.session.add(BusinessAnalytics(business_id=business.id, date=start, profile_views=4, unique_visitors=3,
+                                     reviews_received=1, average_rating=4.5, category_ranking=2))
+    # Counters left NULL, as rows written before a column existed are
+    db.session.execute(BusinessAnalytics.__table__.insert().values(
+        business_id=business.id, date=start + timedelta(days=2), profile_views=7,
+        unique_visitors=None, reviews_received=None, average_rating=None, category_ranking=None
+    ))
+    db.session.commit()
+
+    series = DailySeries.load(business.id, start, start + timedelta(days=3))
+    expected = [row.to_dict() for row in BusinessAnalytics.query.order_by(BusinessAnalytics.date.desc())]
+    assert series.rows() == expected
+    assert expected[0]['unique_visitors'] is None
+    assert series.total('unique_visitors') == 3
+
+def test_export_masks_null_integers(app, tmp_path):
+    business = Business(name='Asempe Kitchen', address='1 Main St', city='Buffalo', state='NY',
+                        category='Restaurant', minority_type='Black-owned')
+    db.session.add(business)
+    db.session.flush()
+    table = BusinessAnalytics.__table__
+    db.session.execute(table.insert(), [
+        {'business_id': business.id, 'date': date(2026, 9, 1), 'profile_views': 4, 'unique_visitors': 0},
+        {'business_id': business.id, 'date': date(2026, 9, 2), 'profile_views': 7, 'unique_visitors': None},
+    ])
+    db.session.commit()
+
+    exported = export_table(db.session.connection(), table, str(tmp_path), chunk_size=1)
+    write_manifest(str(tmp_path), {table.name: exported})
+    assert 'unique_visitors' in exported['masks']
+    assert 'average_rating' not in exported['masks']
+    columns = open_table(str(tmp_path), table.name)
+    assert columns['unique_visitors'].tolist() == [0, None]
+    assert columns['profile_views'].sum() == 11
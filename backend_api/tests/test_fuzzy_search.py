@@ -0,0 +1,44 @@
+import pytest
+
+from src.models.business import Business, db
+from src.indexes.trigram import name_index
+from src.utils.pagination import encode_cursor
+
+NAMES = ['Rochester Jazz Lounge', 'Asempe Kitchen', 'Soul Food Kitchen', 'Buffalo Barber Shop']
+
+@pytest.fixture
+def businesses(app):
+    for name in NAMES:
+        db.session.add(Business(name=name, address='1 Main St', city='Buffalo', state='NY',
+                                category='Restaurant', minority_type='Black-owned'))
+    db.session.commit()
+    # The index is process-wide; rebuild it from this test's database
+    name_index.load()
+
+def fuzzy_names(client, search, **params):
+    response = client.get('/api/businesses', query_string=dict(params, search=search, fuzzy='true'))
+    assert response.status_code == 200
+    return [business['name'] for business in response.get_json()['businesses']]
+
+@pytest.mark.parametrize('search, expected', [
+    ('jazz', 'Rochester Jazz Lounge'),
+    ('kitchn', 'Asempe Kitchen'),
+    ('asmpe', 'Asempe Kitchen'),
+    ('soul fod', 'Soul Food Kitchen'),
+])
+def test_fuzzy_matches_words_of_longer_names(client, businesses, search, expected):
+    assert expected in fuzzy_names(client, search)
+
+def test_fuzzy_includes_plain_search_matches(client, businesses):
+    plain = client.get('/api/businesses', query_string={'search': 'kitch'}).get_json()['businesses']
+    assert {business['name'] for business in plain} <= set(fuzzy_names(client, 'kitch'))
+
+def test_fuzzy_relevance_sort(client, businesses):
+    assert fuzzy_names(client, 'jazz', sort='relevance')[0] == 'Rochester Jazz Lounge'
+
+def test_relevance_pages_reject_malformed_cursors(client, businesses):
+    page = client.get('/api/businesses', query_string={'sort': 'relevance', 'per_page': 1000}).get_json()
+    assert page['per_page'] == 100
+    for key in (['high', 1], [0.5, 'x'], [True, 1], [0.5, None]):
+        response = client.get('/api/businesses', query_string={'sort': 'relevance', 'cursor': encode_cursor(key)})
+        assert response.status_code == 400
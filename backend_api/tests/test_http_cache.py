@@ -0,0 +1,17 @@
+from src.models.business import Business, db
+
+def test_etag_decides_not_modified(client):
+    first = client.get('/api/businesses')
+    assert client.get('/api/businesses', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    db.session.add(Business(name='Asempe Kitchen', address='1 Main St', city='Buffalo', state='NY',
+                            category='Restaurant', minority_type='Black-owned'))
+    db.session.commit()
+    response = client.get('/api/businesses', headers={'If-None-Match': first.headers['ETag'],
+                                                      'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 200
+    assert response.get_json()['total'] == 1
+
+    # If-Modified-Since alone never short-circuits the read
+    headers = {'If-Modified-Since': response.headers['Last-Modified']}
+    assert client.get('/api/businesses', headers=headers).status_code == 200
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from src.models.user import db
+from src.models.analytics import activity_partitions
+from src.models.partition import enable_incremental_vacuum, reclaim_space
+
+def activity(moment):
+    return {'user_id': None, 'session_id': 'abc', 'activity_type': 'view_business', 'timestamp': moment}
+
+def stored_ids():
+    events = activity_partitions.union(datetime(2000, 1, 1))
+    return db.session.execute(db.select(events.c.id)).scalars().all()
+
+def test_ids_are_unique_across_months(app):
+    activity_partitions.insert([activity(datetime(2026, 8, 30)), activity(datetime(2026, 8, 31))])
+    activity_partitions.insert([activity(datetime(2026, 9, 1)), activity(datetime(2026, 9, 2))])
+    # A late event for the previous month
+    activity_partitions.insert([activity(datetime(2026, 8, 31, 23, 59))])
+    db.session.commit()
+    ids = stored_ids()
+    assert len(ids) == 5
+    assert len(set(ids)) == 5
+
+def test_sequence_starts_above_stored_ids(app):
+    table = activity_partitions.table(datetime(2026, 8, 1).date())
+    table.create(bind=db.session.connection())
+    db.session.execute(table.insert().values(id=41, session_id='abc', activity_type='search',
+                                             timestamp=datetime(2026, 8, 3)))
+    activity_partitions.insert([activity(datetime(2026, 9, 1))])
+    db.session.commit()
+    assert sorted(stored_ids()) == [41, 42]
+
+@pytest.fixture
+def file_app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'events.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+def test_reclaim_space(file_app):
+    enable_incremental_vacuum()
+    activity_partitions.insert([dict(activity(datetime(2026, 8, 1)), page_url='x' * 150) for _ in range(5000)])
+    db.session.commit()
+    activity_partitions.table(datetime(2026, 8, 1).date()).drop(bind=db.session.connection())
+    db.session.commit()
+    free_pages = db.session.execute(db.text('PRAGMA freelist_count')).scalar()
+    assert free_pages > 20
+
+    assert reclaim_space(10) == free_pages - 10
+    assert reclaim_space() == 0
@@ -0,0 +1,77 @@
+"""Review read paths issue a fixed number of queries however many reviews there are"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from src.models.user import db, User
+from src.models.business import Business
+from src.models.review import Review
+
+MANY = 12
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+def add_business(name):
+    business = Business(name=name, address='1 Main St', city='Buffalo', state='NY',
+                        category='Restaurant', minority_type='Black-owned')
+    db.session.add(business)
+    db.session.commit()
+    return business.id
+
+def add_users(prefix, count):
+    users = [User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com') for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+def add_reviews(pairs):
+    db.session.add_all(Review(business_id=business_id, user_id=user_id, rating=4, review_text='Good')
+                       for business_id, user_id in pairs)
+    db.session.commit()
+    db.session.expunge_all()
+
+def queries_for(client, url, expected_reviews):
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    body = response.get_json()
+    reviews = body['reviews']
+    assert len(reviews) == expected_reviews
+    assert all(review['user']['username'] for review in reviews)
+    return len(statements)
+
+@pytest.fixture
+def catalog(app):
+    one, many = add_business('One Review'), add_business('Many Reviews')
+    authors = add_users('author', MANY)
+    add_reviews([(one, authors[0])] + [(many, user_id) for user_id in authors])
+    return one, many
+
+def test_business_reviews_query_count(client, catalog):
+    one, many = catalog
+    assert (queries_for(client, f'/api/businesses/{one}/reviews?per_page=50', 1) ==
+            queries_for(client, f'/api/businesses/{many}/reviews?per_page=50', MANY))
+
+def test_get_business_query_count(client, catalog):
+    one, many = catalog
+    assert (queries_for(client, f'/api/businesses/{one}', 1) ==
+            queries_for(client, f'/api/businesses/{many}', MANY))
+
+def test_user_reviews_query_count(client, app):
+    businesses = [add_business(f'Business {i}') for i in range(MANY)]
+    one, many = add_users('reviewer', 2)
+    add_reviews([(businesses[0], one)] + [(business_id, many) for business_id in businesses])
+    assert (queries_for(client, f'/api/users/{one}/reviews?per_page=50', 1) ==
+            queries_for(client, f'/api/users/{many}/reviews?per_page=50', MANY))
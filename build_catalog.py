@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Build the catalog data shards for Melanin Market.
+
+Splits frontend_app/public/businesses.json into small per-state, per-city
+and per-category shards plus an index shard (id/name/city/state/category/
+slug only), so a page downloads the businesses it shows instead of the
+whole national catalog. Every shard is minified, written under a
+content-hashed name (an unchanged shard keeps its name and therefore its
+cache entries) and precompressed with gzip and, if the brotli module is
+installed, brotli. manifest.json maps each shard key to its file. Shards
+are deleted once neither the new nor the previous manifest uses them, so
+clients still holding the previous manifest don't get 404s.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz copies are written without it
+    brotli = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend_api'))
+from src.models.slug import make_slug
+
+SOURCE = 'frontend_app/public/businesses.json'
+OUTPUT_DIR = 'frontend_app/public/catalog'
+HASH_LENGTH = 12
+INDEX_FIELDS = ('id', 'name', 'city', 'state', 'category')
+
+def to_url_part(s):
+    """A state, city or category as a shard path component ([a-z0-9-] only, like slugs)"""
+    return make_slug((s or '').replace('/', ' '))
+
+def category_of(b):
+    return (b.get('category') or b.get('type') or '').strip()
+
+def minify(b):
+    """Drop empty fields; the pages already treat missing and empty alike"""
+    return {k: v for k, v in b.items() if v not in (None, '', [], {})}
+
+def index_entry(b):
+    entry = {field: b.get(field) for field in INDEX_FIELDS}
+    entry['category'] = category_of(b)
+    entry['slug'] = make_slug(b.get('name', ''), b.get('city', ''))
+    return minify(entry)
+
+def group_shards(businesses):
+    """{shard key: [businesses]} for every state, city and category"""
+    shards = {}
+    for b in businesses:
+        state = to_url_part((b.get('state') or '').strip())
+        city = to_url_part((b.get('city') or '').strip())
+        category = to_url_part(category_of(b))
+        keys = []
+        if state:
+            keys.append(f'state/{state}')
+            if city:
+                keys.append(f'city/{state}/{city}')
+        if category:
+            keys.append(f'category/{category}')
+        for key in keys:
+            shards.setdefault(key, []).append(minify(b))
+    return shards
+
+def write_shard(key, items):
+    """Write one shard and its compressed copies; returns its manifest entry"""
+    content = json.dumps(items, separators=(',', ':'), ensure_ascii=False, sort_keys=True).encode('utf-8')
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    filename = f"{key.replace('/', '-')}.{digest}.json"
+    path = os.path.join(OUTPUT_DIR, filename)
+
+    entry = {'file': filename, 'hash': digest, 'count': len(items), 'bytes': len(content)}
+    # mtime=0 keeps the .gz byte-identical across builds of the same shard
+    compressed = {'gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed['br'] = brotli.compress(content, quality=11)
+
+    files = {path: content}
+    files.update((f'{path}.{extension}', data) for extension, data in compressed.items())
+    for file_path, data in files.items():
+        # Same name, same content: leave it (and its mtime) alone
+        if not os.path.exists(file_path):
+            with open(file_path, 'wb') as f:
+                f.write(data)
+    for extension, data in compressed.items():
+        entry[f'{extension}_bytes'] = len(data)
+    return entry
+
+def manifest_files(manifest):
+    """File names of every shard a manifest points to"""
+    entries = [manifest['index']] + [e for s in ('states', 'cities', 'categories') for e in manifest[s].values()]
+    return {e['file'] for e in entries}
+
+def previous_files():
+    """Shards of the manifest being replaced, empty on the first build"""
+    try:
+        with open(os.path.join(OUTPUT_DIR, 'manifest.json')) as f:
+            return manifest_files(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return set()
+
+def remove_stale_files(keep):
+    """Delete shards (and compressed copies) that no manifest in `keep` uses.
+
+    Called with the new and the previous manifest's files: clients still
+    holding the previous manifest can fetch its shards until the next build.
+    """
+    removed = 0
+    for filename in os.listdir(OUTPUT_DIR):
+        base = re.sub(r'\.(gz|br)$', '', filename)
+        if filename == 'manifest.json' or base in keep:
+            continue
+        if re.search(rf'\.[0-9a-f]{{{HASH_LENGTH}}}\.json$', base):
+            os.remove(os.path.join(OUTPUT_DIR, filename))
+            removed += 1
+    return removed
+
+def build():
+    with open(SOURCE) as f:
+        data = json.load(f)
+    businesses = data if isinstance(data, list) else data.get('businesses', [])
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    manifest = {'index': write_shard('index', [index_entry(b) for b in businesses]),
+                'states': {}, 'cities': {}, 'categories': {}}
+    sections = {'state': 'states', 'city': 'cities', 'category': 'categories'}
+    for key, items in sorted(group_shards(businesses).items()):
+        kind, name = key.split('/', 1)
+        manifest[sections[kind]][name] = write_shard(key, items)
+
+    entries = [manifest['index']] + [e for s in sections.values() for e in manifest[s].values()]
+    manifest['version'] = hashlib.sha256(''.join(e['hash'] for e in entries).encode()).hexdigest()[:HASH_LENGTH]
+    removed = remove_stale_files(manifest_files(manifest) | previous_files())
+
+    with open(os.path.join(OUTPUT_DIR, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'), sort_keys=True)
+
+    full_size = os.path.getsize(SOURCE)
+    city_sizes = [e.get('br_bytes', e['gz_bytes']) for e in manifest['cities'].values()]
+    print(f"Built catalog {manifest['version']} from {len(businesses)} businesses ({full_size} bytes)")
+    print(f"  - index shard: {manifest['index']['bytes']} bytes, {manifest['index']['gz_bytes']} gzipped")
+    print(f"  - {len(manifest['states'])} state, {len(manifest['cities'])} city and "
+          f"{len(manifest['categories'])} category shards")
+    if city_sizes:
+        print(f"  - largest compressed city shard: {max(city_sizes)} bytes")
+    if brotli is None:
+        print("  - brotli module not installed: wrote .gz copies only")
+    if removed:
+        print(f"  - removed {removed} stale files")
+
+if __name__ == '__main__':
+    build()
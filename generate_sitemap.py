@@ -1,11 +1,44 @@
 #!/usr/bin/env python3
 """
-Generate sitemap.xml for Melanin Market.
+Generate the sitemaps for Melanin Market.
 Includes: homepage, all business profile pages, city pages, city+category pages.
+
+sitemap.xml is a sitemap index. Business profiles are spread over
+sitemap-biz-NN.xml shards by a stable hash of their slug, each kept well
+under the protocol's 50,000 URL / 50 MB limit; the homepage, city and
+city+category pages go in sitemap-places*.xml. Every sitemap also gets a
+.gz copy.
+
+The source is streamed twice and never held in memory: the first pass
+fingerprints each shard from its slugs and lastmods, the second writes
+only the shards whose fingerprint changed since the previous run (kept in
+frontend_app/.sitemap-state.json). Businesses come from businesses.json
+or, with --db, from the SQL businesses table, whose stored slugs (which
+may carry an id suffix) are used as they are.
 """
+import argparse
+import gzip
+import hashlib
 import json
+import os
 import re
-from datetime import date
+import shutil
+import sqlite3
+import sys
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend_api'))
+from src.utils.json_stream import iter_json_array
+
+BASE_URL = 'https://www.melanin-market.com'
+JSON_SOURCE = 'frontend_app/public/businesses.json'
+DB_SOURCE = 'backend_api/src/database/app.db'
+OUTPUT_DIR = 'frontend_app/public'
+STATE_FILE = 'frontend_app/.sitemap-state.json'
+MAX_URLS_PER_SITEMAP = 50000
+MAX_BYTES_PER_SITEMAP = 50 * 1024 * 1024
+TARGET_URLS_PER_SHARD = 25000  # headroom, so shards rarely need re-splitting
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
 
 def make_slug(name, city=''):
     base = f"{name or ''} {city or ''}".lower()
@@ -17,75 +50,232 @@ def make_slug(name, city=''):
 def to_url_part(s):
     return (s or '').lower().replace(' ', '-').replace('/', '-')
 
-with open('frontend_app/public/businesses.json') as f:
-    data = json.load(f)
-
-businesses = data if isinstance(data, list) else data.get('businesses', [])
-today = date.today().isoformat()
-base = 'https://www.melanin-market.com'
-
-urls = []
-
-# Homepage
-urls.append({'loc': base, 'changefreq': 'daily', 'priority': '1.0'})
-
-# Business profile pages
-for b in businesses:
-    slug = make_slug(b.get('name', ''), b.get('city', ''))
-    if slug and slug != '-':
-        urls.append({
-            'loc': f"{base}/biz/{slug}",
-            'changefreq': 'weekly',
-            'priority': '0.8',
-            'lastmod': b.get('dateAdded', today)
-        })
-
-# City pages and city+category pages
-city_cats = {}
-for b in businesses:
-    city = b.get('city', '').strip()
-    state = b.get('state', '').strip()
-    cat = (b.get('category') or b.get('type') or '').strip()
-    if city and state:
-        key = (to_url_part(state), to_url_part(city))
-        if key not in city_cats:
-            city_cats[key] = set()
-        if cat:
-            city_cats[key].add(to_url_part(cat))
-
-for (state_slug, city_slug), cats in city_cats.items():
-    urls.append({
-        'loc': f"{base}/{state_slug}/{city_slug}",
-        'changefreq': 'weekly',
-        'priority': '0.7'
-    })
-    for cat_slug in cats:
-        if cat_slug:
-            urls.append({
-                'loc': f"{base}/{state_slug}/{city_slug}/{cat_slug}",
-                'changefreq': 'weekly',
-                'priority': '0.6'
-            })
-
-# Write sitemap.xml
-lines = ['<?xml version="1.0" encoding="UTF-8"?>']
-lines.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
-for u in urls:
-    lines.append('  <url>')
-    lines.append(f'    <loc>{u["loc"]}</loc>')
-    if 'lastmod' in u:
-        lines.append(f'    <lastmod>{u["lastmod"]}</lastmod>')
-    lines.append(f'    <changefreq>{u["changefreq"]}</changefreq>')
-    lines.append(f'    <priority>{u["priority"]}</priority>')
-    lines.append('  </url>')
-lines.append('</urlset>')
-
-sitemap_content = '\n'.join(lines)
-with open('frontend_app/public/sitemap.xml', 'w') as f:
-    f.write(sitemap_content)
-
-print(f"Generated sitemap.xml with {len(urls)} URLs")
-print(f"  - 1 homepage")
-print(f"  - {sum(1 for u in urls if '/biz/' in u['loc'])} business profiles")
-print(f"  - {sum(1 for u in urls if u['loc'].count('/') == 4)} city pages")
-print(f"  - {sum(1 for u in urls if u['loc'].count('/') == 5)} city+category pages")
+def iter_json_businesses(path):
+    """(slug, city, state, category, lastmod) for each business in a JSON export"""
+    with open(path) as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        # Older exports wrap the list in {"businesses": [...]}
+        records = iter_json_array(f) if first == '[' else json.load(f).get('businesses', [])
+        for b in records:
+            yield (make_slug(b.get('name'), b.get('city')), b.get('city'), b.get('state'),
+                   b.get('category') or b.get('type'), b.get('dateAdded'))
+
+def iter_sql_businesses(path):
+    """(slug, city, state, category, lastmod) for each row of the businesses table.
+
+    The slug is the one /biz/<slug> resolves, not recomputed from the name.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute(
+            'SELECT slug, city, state, category, COALESCE(updated_at, created_at) FROM businesses'
+        )
+        for slug, city, state, category, changed_at in rows:
+            yield slug, city, state, category, changed_at[:10] if changed_at else None
+    finally:
+        connection.close()
+
+def shard_of(slug, shard_count):
+    return int(hashlib.md5(slug.encode()).hexdigest()[:8], 16) % shard_count
+
+def biz_filename(index):
+    return f'sitemap-biz-{index:02d}.xml'
+
+def scan(businesses, shard_count):
+    """First pass: per-shard fingerprints and the city/category pages.
+
+    A shard's fingerprint is an order-independent sum of hashes of its
+    (slug, lastmod) pairs, so it only changes when one of its businesses
+    is added, removed, renamed or modified.
+    """
+    shards = [{'fingerprint': 0, 'count': 0, 'lastmod': None} for _ in range(shard_count)]
+    city_cats = {}
+    for slug, city, state, category, lastmod in businesses:
+        if slug and slug != '-':
+            shard = shards[shard_of(slug, shard_count)]
+            digest = hashlib.sha256(f'{slug}\0{lastmod or ""}'.encode()).digest()
+            shard['fingerprint'] = (shard['fingerprint'] + int.from_bytes(digest[:16], 'big')) % (1 << 128)
+            shard['count'] += 1
+            if lastmod and (shard['lastmod'] is None or lastmod > shard['lastmod']):
+                shard['lastmod'] = lastmod
+
+        city = (city or '').strip()
+        state = (state or '').strip()
+        cat = (category or '').strip()
+        if city and state:
+            key = (to_url_part(state), to_url_part(city))
+            if key not in city_cats:
+                city_cats[key] = set()
+            if cat:
+                city_cats[key].add(to_url_part(cat))
+    return shards, city_cats
+
+def place_urls(city_cats):
+    urls = [{'loc': BASE_URL, 'changefreq': 'daily', 'priority': '1.0'}]
+    for (state_slug, city_slug), cats in sorted(city_cats.items()):
+        urls.append({'loc': f"{BASE_URL}/{state_slug}/{city_slug}", 'changefreq': 'weekly', 'priority': '0.7'})
+        for cat_slug in sorted(cats):
+            if cat_slug:
+                urls.append({
+                    'loc': f"{BASE_URL}/{state_slug}/{city_slug}/{cat_slug}",
+                    'changefreq': 'weekly',
+                    'priority': '0.6'
+                })
+    return urls
+
+class SitemapWriter:
+    """Streams a <urlset> to a temporary file; close() moves it into place
+    and writes the .gz copy"""
+
+    def __init__(self, filename):
+        self.path = os.path.join(OUTPUT_DIR, filename)
+        self.file = open(f'{self.path}.tmp', 'w', encoding='utf-8')
+        self.count = 0
+        self.bytes = 0
+        self._write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._write(f'<urlset xmlns="{XMLNS}">\n')
+
+    def _write(self, text):
+        self.file.write(text)
+        self.bytes += len(text.encode('utf-8'))
+
+    def add(self, u):
+        if self.count >= MAX_URLS_PER_SITEMAP or self.bytes >= MAX_BYTES_PER_SITEMAP - 1024:
+            raise ValueError(f'{self.path} is over the sitemap size limit')
+        lines = ['  <url>', f'    <loc>{escape(u["loc"])}</loc>']
+        if u.get('lastmod'):
+            lines.append(f'    <lastmod>{u["lastmod"]}</lastmod>')
+        lines.append(f'    <changefreq>{u["changefreq"]}</changefreq>')
+        lines.append(f'    <priority>{u["priority"]}</priority>')
+        lines.append('  </url>\n')
+        self._write('\n'.join(lines))
+        self.count += 1
+
+    def close(self):
+        self._write('</urlset>\n')
+        self.file.close()
+        os.replace(f'{self.path}.tmp', self.path)
+        write_gzip(self.path)
+
+def write_gzip(path):
+    # mtime=0 keeps the .gz identical when the sitemap is
+    with open(path, 'rb') as source, open(f'{path}.gz.tmp', 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9, mtime=0) as target:
+            shutil.copyfileobj(source, target)
+    os.replace(f'{path}.gz.tmp', f'{path}.gz')
+
+def write_business_shards(businesses, shard_count, changed):
+    """Second pass: stream the businesses of the changed shards to disk"""
+    writers = {index: SitemapWriter(biz_filename(index)) for index in changed}
+    try:
+        if writers:
+            for slug, city, state, category, lastmod in businesses:
+                if not slug or slug == '-':
+                    continue
+                writer = writers.get(shard_of(slug, shard_count))
+                if writer is not None:
+                    writer.add({
+                        'loc': f"{BASE_URL}/biz/{slug}",
+                        'changefreq': 'weekly',
+                        'priority': '0.8',
+                        'lastmod': lastmod
+                    })
+    except BaseException:
+        for writer in writers.values():
+            writer.file.close()
+            os.remove(writer.file.name)
+        raise
+    for writer in writers.values():
+        writer.close()
+
+def write_index(entries):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<sitemapindex xmlns="{XMLNS}">']
+    for filename, lastmod in entries:
+        lines.append('  <sitemap>')
+        lines.append(f'    <loc>{BASE_URL}/{filename}</loc>')
+        if lastmod:
+            lines.append(f'    <lastmod>{lastmod}</lastmod>')
+        lines.append('  </sitemap>')
+    lines.append('</sitemapindex>')
+    path = os.path.join(OUTPUT_DIR, 'sitemap.xml')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+    write_gzip(path)
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+def generate(businesses, full=False):
+    """Generate the sitemaps from `businesses`, a callable returning a fresh
+    iterator of (slug, city, state, category, lastmod)"""
+    state = load_state()
+    previous = {} if full else state.get('fingerprints', {})
+    shard_count = state.get('shard_count', 1)
+
+    shards, city_cats = scan(businesses(), shard_count)
+    total = sum(shard['count'] for shard in shards)
+    if max(shard['count'] for shard in shards) > TARGET_URLS_PER_SHARD * 1.5:
+        # Re-split into a power of two shards; every shard changes
+        while shard_count * TARGET_URLS_PER_SHARD < total:
+            shard_count *= 2
+        shards, city_cats = scan(businesses(), shard_count)
+
+    fingerprints = {}
+    changed = []
+    for index, shard in enumerate(shards):
+        filename = biz_filename(index)
+        fingerprints[filename] = format(shard['fingerprint'], '032x')
+        if previous.get(filename) != fingerprints[filename] or not os.path.exists(os.path.join(OUTPUT_DIR, filename)):
+            changed.append(index)
+    write_business_shards(businesses(), shard_count, changed)
+
+    places = place_urls(city_cats)
+    place_files = []
+    for start in range(0, len(places), MAX_URLS_PER_SITEMAP):
+        chunk = places[start:start + MAX_URLS_PER_SITEMAP]
+        filename = 'sitemap-places.xml' if not start else f'sitemap-places-{start // MAX_URLS_PER_SITEMAP + 1}.xml'
+        place_files.append(filename)
+        fingerprints[filename] = hashlib.sha256('\n'.join(u['loc'] for u in chunk).encode()).hexdigest()[:32]
+        if previous.get(filename) != fingerprints[filename] or not os.path.exists(os.path.join(OUTPUT_DIR, filename)):
+            writer = SitemapWriter(filename)
+            for u in chunk:
+                writer.add(u)
+            writer.close()
+            changed.append(filename)
+
+    write_index([(filename, None) for filename in place_files] +
+                [(biz_filename(index), shard['lastmod']) for index, shard in enumerate(shards)])
+
+    for filename in set(state.get('fingerprints', {})) - set(fingerprints):
+        for path in (os.path.join(OUTPUT_DIR, filename), os.path.join(OUTPUT_DIR, f'{filename}.gz')):
+            if os.path.exists(path):
+                os.remove(path)
+
+    with open(STATE_FILE, 'w') as f:
+        json.dump({'shard_count': shard_count, 'fingerprints': fingerprints}, f, indent=2, sort_keys=True)
+
+    print(f"Generated sitemap index with {len(shards) + len(place_files)} sitemaps "
+          f"({len(changed)} rewritten)")
+    print(f"  - 1 homepage")
+    print(f"  - {total} business profiles in {len(shards)} shards")
+    print(f"  - {len(city_cats)} city pages")
+    print(f"  - {len(places) - 1 - len(city_cats)} city+category pages")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the Melanin Market sitemaps')
+    parser.add_argument('--json', default=JSON_SOURCE, help='businesses.json export to read')
+    parser.add_argument('--db', nargs='?', const=DB_SOURCE,
+                        help='read the businesses table of this SQLite database instead')
+    parser.add_argument('--full', action='store_true', help='rewrite every sitemap')
+    args = parser.parse_args()
+
+    if args.db:
+        generate(lambda: iter_sql_businesses(args.db), full=args.full)
+    else:
+        generate(lambda: iter_json_businesses(args.json), full=args.full)